@@ -1,22 +1,426 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, jsonify
+import mimetypes
+from flask import Flask, render_template, request, redirect, url_for, send_from_directory, jsonify, abort, Response, g
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
-from models.face_detection import detect_faces
-from models.face_recognition import recognize_faces
-from models.filters import apply_filter
-from models.object_detection import detect_objects
+from models import face_detection as face_detector
+from models.face_detection import cascade_health, detect_faces_bytes, detect_faces_image, load_cascade
+from models.face_recognition import recognize_faces_bytes, recognize_faces_image
+from models.filters import CARTOON_QUALITY, FILTERS, apply_filter_bytes, apply_filter_image
+from models import imageio
+from models.imageio import ImageTooLarge, decode_image, decode_reduced, encode_image
+from models import object_detection as object_detector
+from models.object_detection import detect_objects_bytes, detect_objects_image
+from models.preview import PreviewCache, render_preview, render_full
+from models.video import VideoPipeline
+from models.registry import registry
+from models.results import ResultStore
+from models.storage import UploadStorage
+from models.cache import ResultCache, make_key
+from models.jobs import JobQueue, QueueFull
+from models import scheduler
+from models import analysis
+from models import bands
+from models.postprocess import rescale_results
+from models.metrics import current_rss, metrics, requests_total, request_seconds, timing_hook
+from models.stages import add_span_hook
 import base64
+import json
+import tempfile
+import threading
 import time
+import uuid
 
 app = Flask(__name__)
 app.config["UPLOAD_FOLDER"] = "uploads"
 app.config["ALLOWED_EXTENSIONS"] = {"png", "jpg", "jpeg"}
 
+# Upload limits. Bodies over MAX_CONTENT_LENGTH get 413 before they are read
+# (multipart files are spooled to disk by Werkzeug past 500 KB); images over
+# MAX_IMAGE_PIXELS are rejected from their header, before decoding
+app.config["MAX_CONTENT_LENGTH"] = 32 * 1024 * 1024
+app.config["MAX_VIDEO_LENGTH"] = 512 * 1024 * 1024
+app.config["MAX_IMAGE_PIXELS"] = 50_000_000
+# JSON-only API calls (image=none) decode JPEGs at 1/2, 1/4 or 1/8 scale
+# while the longest side stays at least this large; boxes are mapped back
+app.config["DECODE_MAX_SIDE"] = {
+    "face_detection": 1024,
+    "object_detection": 1024,
+    "face_recognition": 1600,
+    "analyze": 1600,
+}
+
+imageio.configure(max_pixels=app.config["MAX_IMAGE_PIXELS"])
+
+# DNN backend ("default", "opencv", "opencv_fp16", "openvino", "onnxruntime",
+# or "auto" to benchmark the available ones at startup) and per-model file
+# variants, e.g. {"ssd": "int8", "age": "fp16"}
+app.config["DNN_BACKEND"] = "default"
+app.config["MODEL_VARIANTS"] = {}
+# Models load on first use; the dev server also warms them in the background
+app.config["PREFETCH_MODELS"] = True
+
+registry.configure(
+    backend=app.config["DNN_BACKEND"],
+    variants=app.config["MODEL_VARIANTS"]
+)
+
+# Micro-batching of DNN forward passes across concurrent requests
+app.config["BATCH_INFERENCE"] = True
+app.config["BATCH_WINDOW_MS"] = 5
+app.config["BATCH_MAX_SIZE"] = 8
+
+scheduler.configure(
+    enabled=app.config["BATCH_INFERENCE"],
+    window_ms=app.config["BATCH_WINDOW_MS"],
+    max_batch=app.config["BATCH_MAX_SIZE"]
+)
+
+# Haar face detection: longest side the cascade sees, default cascade
+# settings and the optional DNN pre-pass that skips images without faces
+app.config["FACE_MAX_SIDE"] = 1024
+app.config["FACE_SCALE_FACTOR"] = 1.1
+app.config["FACE_MIN_SIZE"] = 30
+app.config["FACE_PREPASS"] = False
+
+face_detector.configure(
+    max_side=app.config["FACE_MAX_SIDE"],
+    scale_factor=app.config["FACE_SCALE_FACTOR"],
+    min_size=app.config["FACE_MIN_SIZE"],
+    prepass=app.config["FACE_PREPASS"]
+)
+
+# Tiled SSD inference for large images; a request can switch it on or off
+# with a "tiled" form field
+app.config["OBJECT_TILED"] = False
+app.config["OBJECT_TILE_SIZE"] = 300
+app.config["OBJECT_TILE_OVERLAP"] = 0.25
+app.config["OBJECT_MAX_TILES"] = 16
+app.config["OBJECT_TILE_BATCH"] = 8
+app.config["OBJECT_TILE_WORKERS"] = 2
+
+object_detector.configure(
+    tiled=app.config["OBJECT_TILED"],
+    tile_size=app.config["OBJECT_TILE_SIZE"],
+    overlap=app.config["OBJECT_TILE_OVERLAP"],
+    max_tiles=app.config["OBJECT_MAX_TILES"],
+    batch_size=app.config["OBJECT_TILE_BATCH"],
+    workers=app.config["OBJECT_TILE_WORKERS"]
+)
+
+# Uploads and results stay in memory unless persistence is switched on
+app.config["PERSIST_UPLOADS"] = False
+app.config["RESULT_STORE_MAX_BYTES"] = 256 * 1024 * 1024
+app.config["RESULT_STORE_TTL"] = 600
+
+results = ResultStore(
+    max_bytes=app.config["RESULT_STORE_MAX_BYTES"],
+    ttl=app.config["RESULT_STORE_TTL"]
+)
+
+# Persisted uploads/results live in sharded subdirectories of UPLOAD_FOLDER
+# and are swept in the background by age and total size
+app.config["UPLOAD_TTL"] = 24 * 3600
+app.config["UPLOAD_MAX_BYTES"] = 1024 * 1024 * 1024
+app.config["UPLOAD_SWEEP_INTERVAL"] = 300
+
+storage = UploadStorage(
+    app.config["UPLOAD_FOLDER"],
+    ttl=app.config["UPLOAD_TTL"],
+    max_bytes=app.config["UPLOAD_MAX_BYTES"],
+    sweep_interval=app.config["UPLOAD_SWEEP_INTERVAL"]
+)
+
+# Content-addressed cache of processed results; the disk tier is optional
+app.config["RESULT_CACHE_MAX_BYTES"] = 128 * 1024 * 1024
+app.config["RESULT_CACHE_DIR"] = None
+app.config["RESULT_CACHE_DISK_MAX_BYTES"] = 1024 * 1024 * 1024
+
+cache = ResultCache(
+    max_bytes=app.config["RESULT_CACHE_MAX_BYTES"],
+    disk_dir=app.config["RESULT_CACHE_DIR"],
+    disk_max_bytes=app.config["RESULT_CACHE_DISK_MAX_BYTES"]
+)
+
+# Background jobs for slow filters and detection, run on a process pool
+app.config["JOB_WORKERS"] = os.cpu_count()
+app.config["JOB_MAX_PENDING"] = 32
+app.config["JOB_TIMEOUT"] = 120
+app.config["JOB_RESULT_TTL"] = 600
+
+jobs = JobQueue(
+    max_workers=app.config["JOB_WORKERS"],
+    max_pending=app.config["JOB_MAX_PENDING"],
+    timeout=app.config["JOB_TIMEOUT"],
+    ttl=app.config["JOB_RESULT_TTL"],
+    # Spawned workers start from module defaults; give them the app's
+    # settings. With DNN_BACKEND "auto" they use the default backend
+    worker_config={
+        "registry": {"backend": app.config["DNN_BACKEND"],
+                     "variants": app.config["MODEL_VARIANTS"]},
+        "face_detection": face_detector.SETTINGS,
+        "object_detection": object_detector.SETTINGS,
+        "imageio": imageio.SETTINGS,
+    }
+)
+
+# Video/webcam streaming: full detection every Nth frame, trackers in between
+app.config["VIDEO_EXTENSIONS"] = {"mp4", "avi", "mov", "mkv", "webm"}
+app.config["STREAM_DETECT_EVERY"] = 5
+app.config["STREAM_JPEG_QUALITY"] = 80
+app.config["STREAM_STATS_TTL"] = 600
+# Uploaded videos nobody starts playing within this many seconds are closed
+# and their temp file removed
+app.config["STREAM_START_TTL"] = 300
+
+streams = {}
+# The expiry timer and request threads both prune streams
+streams_lock = threading.Lock()
+
+# Live filter preview: decoded originals and proxies kept per session handle
+app.config["PREVIEW_CACHE_MAX_BYTES"] = 512 * 1024 * 1024
+app.config["PREVIEW_MAX_SIDE"] = 1024
+
+# Cartoon colour quantization when a request does not pick one with
+# "quality": fast, balanced (sampled k-means) or exact (full k-means)
+app.config["CARTOON_QUALITY"] = "balanced"
+
+previews = PreviewCache(
+    max_bytes=app.config["PREVIEW_CACHE_MAX_BYTES"],
+    proxy_max_side=app.config["PREVIEW_MAX_SIDE"]
+)
+
+# Threads shared by /api/v1/analyze requests to run their models side by side
+app.config["ANALYZE_WORKERS"] = 3
+
+analysis.configure(workers=app.config["ANALYZE_WORKERS"])
+
+# Local filters on images over FILTER_BAND_MIN_PIXELS run as parallel row
+# bands on FILTER_WORKERS threads (gunicorn.conf.py lowers this per worker)
+app.config["FILTER_WORKERS"] = os.cpu_count() or 1
+app.config["FILTER_BAND_MIN_PIXELS"] = 1_000_000
+
+bands.configure(
+    workers=app.config["FILTER_WORKERS"],
+    min_pixels=app.config["FILTER_BAND_MIN_PIXELS"]
+)
+
+# Prometheus metrics on /metrics. The span hook times every stage and model
+# call; gauges are read at scrape time. Job pool workers are separate
+# processes and only show up through the queue gauge.
+app.config["METRICS_ENABLED"] = True
+
+if app.config["METRICS_ENABLED"]:
+    add_span_hook(timing_hook)
+
+metrics.gauge("lynx_job_queue_pending", "Jobs queued or running", jobs.pending)
+metrics.gauge("lynx_batch_queue_depth", "Forward requests waiting for a batch",
+              lambda: {(m,): d for m, d in scheduler.queue_depths().items()}, ("model",))
+metrics.gauge("lynx_result_cache_lookups_total", "Result cache lookups by outcome",
+              lambda: {(k,): cache.stats()[k] for k in ("memory_hits", "disk_hits", "misses")},
+              ("outcome",), kind="counter")
+metrics.gauge("lynx_result_cache_hit_ratio", "Result cache hits per lookup",
+              lambda: cache.stats()["hit_rate"])
+metrics.gauge("lynx_result_cache_bytes", "Bytes held by the result cache",
+              lambda: {("memory",): cache.stats()["bytes"], ("disk",): cache.stats()["disk_bytes"]},
+              ("tier",))
+metrics.gauge("lynx_startup_seconds", "Time from process start to models warmed up",
+              lambda: startup["seconds"])
+metrics.gauge("lynx_active_streams", "Video streams still running",
+              lambda: sum(1 for p in list(streams.values()) if p.stats.finished is None))
+
+
+# Set by preload(); workers forked after it inherit the warm models and state
+startup = {"ready": False, "seconds": None, "rss_bytes": None, "warm_up_ms": {}}
+
+
+def preload(started=None, background=False):
+    """Autotune (if configured) and warm every model, then mark ready.
+
+    Models also load lazily on first use, so this is only about latency.
+    wsgi.py calls it in the gunicorn master before workers are forked so
+    they share the loaded weights copy-on-write; the dev server runs it in
+    the background (PREFETCH_MODELS) and starts serving straight away.
+    """
+    started = time.perf_counter() if started is None else started
+    if background:
+        thread = threading.Thread(target=preload, args=(started,), daemon=True)
+        thread.start()
+        return thread
+
+    if app.config["DNN_BACKEND"] == "auto":
+        print(f"DNN autotune: {registry.autotune()}")
+    start = time.perf_counter()
+    try:
+        load_cascade()
+        startup["warm_up_ms"]["haar_cascade"] = round((time.perf_counter() - start) * 1000, 2)
+    except FileNotFoundError as e:
+        print(f"Warm-up failed for haar_cascade: {e}")
+    startup["warm_up_ms"].update(registry.warm_up())
+    startup["seconds"] = round(time.perf_counter() - started, 3)
+    startup["rss_bytes"] = current_rss()
+    startup["ready"] = True
+    print(f"Models ready in {startup['seconds']}s, RSS {startup['rss_bytes'] / 2 ** 20:.1f} MB")
+
+
+@app.errorhandler(413)
+def too_large(e):
+    message = f"Upload too large; the limit is {request.max_content_length // 2 ** 20} MB."
+    if request.path.startswith(("/api/", "/jobs", "/filters/", "/stream/")):
+        return jsonify({"success": False, "error": message}), 413
+    return message, 413
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    if app.config["METRICS_ENABLED"] and "request_start" in g:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        request_seconds.observe(time.perf_counter() - g.request_start,
+                                route=route, method=request.method)
+        requests_total.inc(route=route, method=request.method, status=response.status_code)
+    return response
+
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in app.config["ALLOWED_EXTENSIONS"]
 
 
+def file_ext(filename):
+    return "." + filename.rsplit(".", 1)[1].lower()
+
+
+def filter_params(data):
+    """Pull the filter name and slider values out of a JSON request body;
+    raises ValueError on bad input."""
+    filter_type = data.get("filter", "none")
+    if filter_type not in FILTERS:
+        raise ValueError(f"Unknown filter: {filter_type}")
+    if filter_type == "cartoon":
+        quality = data.get("quality") or app.config["CARTOON_QUALITY"]
+        if quality not in CARTOON_QUALITY:
+            raise ValueError(f"quality must be one of: {', '.join(CARTOON_QUALITY)}")
+        return filter_type, {"quality": quality}
+    if filter_type == "vintage" and data.get("seed") not in (None, ""):
+        return filter_type, {"seed": int_param(data, "seed", 0)}
+    if filter_type != "adjustable":
+        return filter_type, {}
+    return filter_type, {
+        "brightness": int_param(data, "brightness", 100),
+        "contrast": int_param(data, "contrast", 100),
+        "sepia": int_param(data, "sepia", 0),
+        "blur": int_param(data, "blur", 0),
+    }
+
+
+def int_param(data, key, default):
+    """data[key] as an int; missing, null or empty means default."""
+    value = data.get(key)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a whole number") from None
+
+
+def face_params(data):
+    """Optional per-request cascade settings; raises ValueError on bad input."""
+    params = {}
+    if data.get("scale_factor"):
+        try:
+            params["scale_factor"] = float(data["scale_factor"])
+        except ValueError:
+            raise ValueError("scale_factor must be a number") from None
+        if not 1.0 < params["scale_factor"] <= 2.0:
+            raise ValueError("scale_factor must be greater than 1.0 and at most 2.0")
+    for key in ("min_size", "max_size"):
+        if data.get(key):
+            try:
+                params[key] = int(data[key])
+            except ValueError:
+                params[key] = 0
+            if params[key] <= 0:
+                raise ValueError(f"{key} must be a positive number of pixels")
+    return params
+
+
+def scale_face_params(params, factor):
+    """min_size/max_size are original-image pixels; convert them for an image
+    that was decoded factor times smaller."""
+    return {k: v / factor if k in ("min_size", "max_size") else v for k, v in params.items()}
+
+
+def tiled_param(data):
+    """The request's "tiled" flag, or the OBJECT_TILED default."""
+    value = data.get("tiled")
+    if value in (None, ""):
+        return app.config["OBJECT_TILED"]
+    return str(value).lower() in ("1", "true", "on", "yes")
+
+
+def cached(operation, data, compute, **params):
+    """Return compute()'s (image, results) for data, reusing earlier runs."""
+    key = make_key(data, operation, **params)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+    output, meta = compute()
+    cache.put(key, output, meta)
+    return output, meta
+
+
+def publish_result(data, output_filename, original=None, filename=None):
+    """Make an encoded result reachable by the browser and return its URL.
+
+    With PERSIST_UPLOADS the upload (named by content hash) and the result
+    (named by UUID) are written to the upload storage; otherwise the result
+    only lives in the in-memory result store. The given names only supply
+    the extension.
+    """
+    ext = os.path.splitext(output_filename)[1] or ".jpg"
+    if app.config["PERSIST_UPLOADS"]:
+        storage.start_sweeper()
+        if original is not None and filename:
+            storage.save(original, os.path.splitext(filename)[1] or ext, content_hash=True)
+        return url_for("uploaded_file", filename=storage.save(data, ext))
+
+    mimetype = mimetypes.guess_type(output_filename)[0] or "application/octet-stream"
+    key = results.put(data, mimetype, ext)
+    return url_for("result_file", key=key)
+
+
+@app.route("/healthz")
+def liveness():
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+
+@app.route("/readyz")
+def readiness():
+    """200 once models are warmed up; failed models are listed, not fatal"""
+    health = registry.health()
+    body = dict(
+        startup,
+        status="ready" if startup["ready"] else "starting",
+        pid=os.getpid(),
+        rss_bytes_now=current_rss(),
+        failed_models=sorted([name for name, h in health.items() if h["error"]] +
+                             (["haar_cascade"] if cascade_health()["error"] else [])),
+    )
+    return jsonify(body), 200 if startup["ready"] else 503
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    if not app.config["METRICS_ENABLED"]:
+        abort(404)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/")
 def home():
     return render_template("index.html")
@@ -32,19 +436,29 @@ def face_detection():
             return redirect(request.url)
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-            file.save(filepath)
-
-            # Processed output filename
-            output_filename = "processed_" + filename
-            output_path = os.path.join(app.config["UPLOAD_FOLDER"], output_filename)
+            data = file.read()
 
             # Run detection
-            num_faces = detect_faces(filepath, output_path)
+            try:
+                ext = file_ext(filename)
+                params = face_params(request.form)
+                output, num_faces = cached(
+                    "face_detection", data,
+                    lambda: detect_faces_bytes(data, ext, **params), ext=ext, **params)
+            except ImageTooLarge as e:
+                return render_template("face.html", error=str(e)), 413
+            except ValueError as e:
+                # Bad form values or an undecodable image
+                return render_template("face.html", error=str(e)), 400
+            except FileNotFoundError as e:
+                # Model unavailable; the rest of the app keeps working
+                return render_template("face.html", error=str(e)), 503
+
+            image_url = publish_result(output, "processed_" + filename, data, filename)
 
             return render_template(
                 "face.html",
-                filename=output_filename,
+                image_url=image_url,
                 faces=num_faces
             )
     return render_template("face.html")
@@ -60,27 +474,50 @@ def face_recognition():
             return redirect(request.url)
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-            file.save(filepath)
+            data = file.read()
 
-            # Processed output filename
-            output_filename = "recog_" + filename
-            output_path = os.path.join(app.config["UPLOAD_FOLDER"], output_filename)
+            # Run recognition
+            ext = file_ext(filename)
+            try:
+                output, people = cached(
+                    "face_recognition", data,
+                    lambda: recognize_faces_bytes(data, ext), ext=ext)
+            except ImageTooLarge as e:
+                return render_template("facerecog.html", error=str(e)), 413
+            except ValueError as e:
+                return render_template("facerecog.html", error=str(e)), 400
+            except FileNotFoundError as e:
+                return render_template("facerecog.html", error=str(e)), 503
 
-            # Run recognition 
-            people = recognize_faces(filepath, output_path)
+            image_url = publish_result(output, "recog_" + filename, data, filename)
 
             return render_template(
                 "facerecog.html",
-                filename=output_filename,
+                image_url=image_url,
                 people=people
             )
     return render_template("facerecog.html")
 
 
-@app.route("/uploads/<filename>")
+@app.route("/uploads/<path:filename>")
 def uploaded_file(filename):
-    return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+    if storage.resolve(filename) is None:
+        abort(404)
+    return send_from_directory(storage.root, filename)
+
+
+@app.route("/results/<key>")
+def result_file(key):
+    item = results.get(key)
+    if item is None:
+        abort(404)
+    data, mimetype = item
+    return Response(data, mimetype=mimetype)
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify(cache.stats())
+
 
 @app.route("/filters", methods=["GET"])
 def filters():
@@ -91,48 +528,43 @@ def filters():
 def apply_filter_route():
     """Apply OpenCV filter to uploaded image"""
     try:
-        data = request.get_json()
-        
-        # Get the base64 image data
-        img_data = data["image"].split(",")[1]
-        filter_type = data.get("filter", "none")
-        
-        # Get slider values for adjustable filter
-        brightness = data.get("brightness", 100)
-        contrast = data.get("contrast", 100)
-        sepia = data.get("sepia", 0)
-        blur = data.get("blur", 0)
-        
+        file = request.files.get("file")
+        if file is not None:
+            # Multipart upload: no base64, and Werkzeug spools it to disk
+            original = file.read()
+            filter_type, params = filter_params(request.form)
+        else:
+            data = request.get_json()
+
+            # Decode the base64 data-URL payload, dropping the JSON copy
+            image_field = data.pop("image")
+            original = base64.b64decode(image_field[image_field.find(",") + 1:])
+            del image_field
+
+            # Filter name plus slider values for adjustable filter
+            filter_type, params = filter_params(data)
+
         # Generate unique filename with timestamp
         timestamp = str(int(time.time() * 1000))
         filename = f"filtered_{filter_type}_{timestamp}.jpg"
-        filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        
-        # Decode and save input image
-        with open(filepath, "wb") as f:
-            f.write(base64.b64decode(img_data))
-        
-        # Apply filter via OpenCV
-        output_filename = f"processed_{filename}"
-        output_path = os.path.join(app.config["UPLOAD_FOLDER"], output_filename)
-        
-        # If preset filter selected, use that
-        if filter_type != "adjustable":
-            apply_filter(filepath, output_path, filter_type)
-        else:
-            # Use adjustable filter with slider values
-            apply_filter(filepath, output_path, "adjustable",
-                        brightness=int(brightness),
-                        contrast=int(contrast),
-                        sepia=int(sepia),
-                        blur=int(blur))
-        
+
+        output, _ = cached(
+            "filter", original,
+            lambda: (apply_filter_bytes(original, filter_type, **params), None),
+            filter=filter_type, **params)
+
         # Return URL to processed image
         return jsonify({
             "success": True,
-            "url": url_for("uploaded_file", filename=output_filename)
+            "url": publish_result(output, f"processed_{filename}", original, filename)
         })
-        
+
+    except HTTPException:
+        raise
+    except ImageTooLarge as e:
+        return jsonify({"success": False, "error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         print(f"Error applying filter: {e}")
         import traceback
@@ -142,6 +574,243 @@ def apply_filter_route():
             "error": str(e)
         }), 500
 
+
+@app.route("/filters/session", methods=["POST"])
+def filter_session():
+    """Upload the original once and get back a handle for live previews"""
+    file = request.files.get("file")
+    if file is None or file.filename == "" or not allowed_file(file.filename):
+        return jsonify({"success": False, "error": "Invalid file type. Please upload PNG, JPG, or JPEG."}), 400
+
+    try:
+        handle, source = previews.add(file.read())
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    height, width = source.image.shape[:2]
+    return jsonify({
+        "success": True,
+        "handle": handle,
+        "width": width,
+        "height": height,
+        "scale": source.scale
+    })
+
+
+@app.route("/filters/preview", methods=["POST"])
+def filter_preview():
+    """Render the current slider/preset state at proxy resolution"""
+    data = request.get_json()
+    source = previews.get(data.get("handle", ""))
+    if source is None:
+        return jsonify({"success": False, "error": "Preview session expired."}), 404
+
+    try:
+        filter_type, params = filter_params(data)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    image = render_preview(source, filter_type, **params)
+    return Response(encode_image(image, ".jpg"), mimetype="image/jpeg")
+
+
+@app.route("/filters/export", methods=["POST"])
+def filter_export():
+    """Render the final result at full resolution"""
+    data = request.get_json()
+    source = previews.get(data.get("handle", ""))
+    if source is None:
+        return jsonify({"success": False, "error": "Preview session expired."}), 404
+
+    try:
+        filter_type, params = filter_params(data)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    output = encode_image(render_full(source, filter_type, **params), ".jpg")
+
+    timestamp = str(int(time.time() * 1000))
+    return jsonify({
+        "success": True,
+        "url": publish_result(output, f"processed_filtered_{filter_type}_{timestamp}.jpg")
+    })
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """Queue an operation on the worker pool and return its job id"""
+    file = request.files.get("file")
+    if file is None or file.filename == "" or not allowed_file(file.filename):
+        return jsonify({"success": False, "error": "Invalid file type. Please upload PNG, JPG, or JPEG."}), 400
+
+    operation = request.form.get("operation", "filter")
+    params = {"ext": file_ext(secure_filename(file.filename))}
+    try:
+        if operation == "filter":
+            filter_type, filter_settings = filter_params(request.form)
+            params = dict(filter_settings, filter=filter_type)
+        elif operation == "object_detection":
+            params["tiled"] = tiled_param(request.form)
+        elif operation == "face_detection":
+            params.update(face_params(request.form))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    try:
+        job = jobs.submit(operation, file.read(), **params)
+    except QueueFull as e:
+        response = jsonify({"success": False, "error": str(e)})
+        response.headers["Retry-After"] = "5"
+        return response, 429
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status_url": url_for("job_status", job_id=job.id),
+        "events_url": url_for("job_events", job_id=job.id),
+        "result_url": url_for("job_result", job_id=job.id)
+    }), 202
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
+
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Server-sent events stream of status changes until the job finishes"""
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+
+    def stream():
+        last = None
+        while True:
+            state = job.to_dict()
+            if state["status"] != last:
+                last = state["status"]
+                yield f"data: {json.dumps(state)}\n\n"
+            if job.done:
+                return
+            time.sleep(0.25)
+
+    return Response(stream(), mimetype="text/event-stream")
+
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    if job.status != "done":
+        return jsonify(job.to_dict()), 409
+    mimetype = mimetypes.guess_type("result" + job.ext)[0] or "application/octet-stream"
+    return Response(job.image, mimetype=mimetype)
+
+
+def prune_streams():
+    """Close streams never started within STREAM_START_TTL and forget
+    finished ones after STREAM_STATS_TTL."""
+    now = time.time()
+    with streams_lock:
+        for stream_id, pipeline in list(streams.items()):
+            if not pipeline.running and pipeline.stats.finished is None and \
+                    now - pipeline.stats.started > app.config["STREAM_START_TTL"]:
+                pipeline.stats.error = "Expired before playback"
+                pipeline.close()
+            if pipeline.stats.finished and pipeline.stats.finished < now - app.config["STREAM_STATS_TTL"]:
+                streams.pop(stream_id, None)
+
+
+def open_stream(source, realtime, on_close=None):
+    """Create a VideoPipeline for the request and register it for stats"""
+    prune_streams()
+
+    mode = request.args.get("mode", "objects")
+    if mode not in ("objects", "faces"):
+        abort(400)
+
+    pipeline = VideoPipeline(
+        source,
+        mode=mode,
+        detect_every=request.args.get("every", app.config["STREAM_DETECT_EVERY"], type=int),
+        realtime=realtime,
+        on_close=on_close
+    )
+    stream_id = uuid.uuid4().hex
+    with streams_lock:
+        streams[stream_id] = pipeline
+    return stream_id, pipeline
+
+
+def mjpeg_response(pipeline):
+    return Response(
+        pipeline.mjpeg(app.config["STREAM_JPEG_QUALITY"]),
+        mimetype="multipart/x-mixed-replace; boundary=frame"
+    )
+
+
+@app.route("/stream/webcam")
+def stream_webcam():
+    """MJPEG stream of a local camera with detection overlays"""
+    camera = request.args.get("camera", 0, type=int)
+    stream_id, pipeline = open_stream(camera, realtime=True)
+    pipeline.claim()
+    response = mjpeg_response(pipeline)
+    response.headers["X-Stream-Id"] = stream_id
+    return response
+
+
+@app.route("/stream/video", methods=["POST"])
+def stream_video():
+    """Upload a video file; returns a URL that plays it back annotated"""
+    request.max_content_length = app.config["MAX_VIDEO_LENGTH"]
+    file = request.files.get("file")
+    if file is None or "." not in file.filename or \
+            file.filename.rsplit(".", 1)[1].lower() not in app.config["VIDEO_EXTENSIONS"]:
+        return jsonify({"success": False, "error": "Invalid video file."}), 400
+
+    # VideoCapture needs a real path, so the upload is spooled to a temp file
+    suffix = file_ext(secure_filename(file.filename))
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        file.save(tmp)
+    stream_id, _ = open_stream(tmp.name, realtime=False,
+                               on_close=lambda: os.path.exists(tmp.name) and os.remove(tmp.name))
+    # Nothing else may come along to prune it if the video is never played
+    expiry = threading.Timer(app.config["STREAM_START_TTL"] + 1, prune_streams)
+    expiry.daemon = True
+    expiry.start()
+
+    return jsonify({
+        "success": True,
+        "stream_id": stream_id,
+        "stream_url": url_for("stream_play", stream_id=stream_id),
+        "stats_url": url_for("stream_stats", stream_id=stream_id)
+    })
+
+
+@app.route("/stream/<stream_id>")
+def stream_play(stream_id):
+    pipeline = streams.get(stream_id)
+    if pipeline is None or pipeline.stats.finished:
+        abort(404)
+    if not pipeline.claim():
+        return jsonify({"success": False, "error": "Stream is already being played."}), 409
+    return mjpeg_response(pipeline)
+
+
+@app.route("/stream/<stream_id>/stats")
+def stream_stats(stream_id):
+    pipeline = streams.get(stream_id)
+    if pipeline is None:
+        abort(404)
+    return jsonify(pipeline.stats.to_dict())
+
+
 @app.route("/object-detection", methods=["GET", "POST"])
 def object_detection():
     if request.method == "POST":
@@ -161,25 +830,30 @@ def object_detection():
 
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-            file.save(filepath)
-
-            # Processed output filename
-            output_filename = "objects_" + filename
-            output_path = os.path.join(app.config["UPLOAD_FOLDER"], output_filename)
+            data = file.read()
 
             try:
                 # Run object detection
-                results = detect_objects(filepath, output_path)
+                ext = file_ext(filename)
+                tiled = tiled_param(request.form)
+                output, detected = cached(
+                    "object_detection", data,
+                    lambda: detect_objects_bytes(data, ext, tiled), ext=ext, tiled=tiled)
+
+                image_url = publish_result(output, "objects_" + filename, data, filename)
 
                 return render_template(
                     "object_detection.html",
-                    filename=output_filename,
-                    total_objects=results['total_objects'],
-                    object_counts=results['object_counts'],
-                    detections=results['detections']
+                    image_url=image_url,
+                    total_objects=detected['total_objects'],
+                    object_counts=detected['object_counts'],
+                    detections=detected['detections']
                 )
 
+            except ImageTooLarge as e:
+                return render_template("object_detection.html", error=str(e)), 413
+            except ValueError as e:
+                return render_template("object_detection.html", error=str(e)), 400
             except FileNotFoundError as e:
                 # Missing YOLO files
                 return render_template(
@@ -203,7 +877,159 @@ def object_detection():
     return render_template("object_detection.html")
 
 
+# JSON API (v1). Images come in as a multipart "file" field or a raw image/*
+# body; ?image=url|inline|none picks how the annotated image comes back.
+# inline answers with multipart/mixed: the JSON part, then the image bytes.
+
+API_IMAGE_TYPES = {"image/jpeg": ".jpg", "image/jpg": ".jpg", "image/png": ".png"}
+API_IMAGE_MODES = ("url", "inline", "none")
+
+
+def api_error(message, status=400):
+    return jsonify({"success": False, "error": message}), status
+
+
+def api_input():
+    """(image bytes, ext) from the request; raises ValueError when missing."""
+    file = request.files.get("file")
+    if file is not None:
+        if file.filename == "" or not allowed_file(file.filename):
+            raise ValueError("Invalid file type. Please upload PNG, JPG, or JPEG.")
+        return file.read(), file_ext(secure_filename(file.filename))
+
+    ext = API_IMAGE_TYPES.get(request.mimetype)
+    if ext is None:
+        raise ValueError("Send a multipart 'file' field or an image/jpeg or image/png body.")
+    data = request.get_data(cache=False)
+    if not data:
+        raise ValueError("Empty request body.")
+    return data, ext
+
+
+def api_response(operation, analyze, allow_none=True, **params):
+    """Run analyze(image, draw, factor) -> (image, results) on the request
+    image and answer in the requested image mode. factor is how many times
+    smaller than the upload the image was decoded (image=none only); params
+    are part of the cache key."""
+    mode = request.args.get("image", "url")
+    if mode not in API_IMAGE_MODES or (mode == "none" and not allow_none):
+        return api_error(f"Unsupported image mode: {mode}")
+
+    try:
+        data, ext = api_input()
+        if mode == "none":
+            max_side = app.config["DECODE_MAX_SIDE"].get(operation)
+            if max_side and not params.get("tiled"):
+                image, factor = decode_reduced(data, max_side)
+            else:
+                image, factor = decode_image(data), 1
+            _, result = analyze(image, False, factor)
+            if factor != 1:
+                result = rescale_results(result, factor)
+            return jsonify({"success": True, "results": result})
+
+        def compute():
+            image, result = analyze(decode_image(data), True)
+            return encode_image(image, ext), result
+
+        output, result = cached("api:" + operation, data, compute, ext=ext, **params)
+    except ImageTooLarge as e:
+        return api_error(str(e), 413)
+    except ValueError as e:
+        return api_error(str(e))
+    except FileNotFoundError as e:
+        return api_error(str(e), 503)
+
+    mimetype = mimetypes.guess_type("result" + ext)[0]
+    if mode == "url":
+        return jsonify({
+            "success": True,
+            "results": result,
+            "image_url": publish_result(output, f"{operation}{ext}")
+        })
+
+    boundary = uuid.uuid4().hex
+    body = b"".join([
+        f"--{boundary}\r\nContent-Type: application/json\r\n\r\n".encode(),
+        json.dumps({"success": True, "results": result}).encode(),
+        f"\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n"
+        f"Content-Length: {len(output)}\r\n\r\n".encode(),
+        output,
+        f"\r\n--{boundary}--\r\n".encode(),
+    ])
+    return Response(body, mimetype=f"multipart/mixed; boundary={boundary}")
+
+
+@app.route("/api/v1/face-detection", methods=["POST"])
+def api_face_detection():
+    try:
+        params = face_params(request.values)
+    except ValueError as e:
+        return api_error(str(e))
+
+    def analyze(image, draw, factor=1):
+        faces = detect_faces_image(image, draw, **scale_face_params(params, factor))
+        return image, {
+            "count": len(faces),
+            "faces": [{"box": [int(x), int(y), int(x + w), int(y + h)]} for x, y, w, h in faces]
+        }
+    return api_response("face_detection", analyze, **params)
+
+
+@app.route("/api/v1/face-recognition", methods=["POST"])
+def api_face_recognition():
+    def analyze(image, draw, factor=1):
+        people = recognize_faces_image(image, draw=draw)
+        return image, {"count": len(people), "people": people}
+    return api_response("face_recognition", analyze)
+
+
+@app.route("/api/v1/object-detection", methods=["POST"])
+def api_object_detection():
+    tiled = tiled_param(request.values)
+
+    def analyze(image, draw, factor=1):
+        return image, detect_objects_image(image, draw, tiled=tiled)
+    return api_response("object_detection", analyze, tiled=tiled)
+
+
+@app.route("/api/v1/filters/<filter_type>", methods=["POST"])
+def api_filter(filter_type):
+    """Filter settings come from the query string or form, e.g. ?brightness=120"""
+    try:
+        filter_type, params = filter_params(dict(request.values.items(), filter=filter_type))
+    except ValueError as e:
+        return api_error(str(e))
+
+    def analyze(image, draw, factor=1):
+        return apply_filter_image(image, filter_type, **params), {"filter": filter_type, **params}
+    return api_response("filter", analyze, allow_none=False, filter=filter_type, **params)
+
+
+@app.route("/api/v1/analyze", methods=["POST"])
+def api_analyze():
+    """Faces, age/gender and objects from one upload: ?models=faces,people,objects"""
+    names = [n for n in request.values.get("models", ",".join(analysis.ANALYSES)).split(",") if n]
+    unknown = set(names) - set(analysis.ANALYSES)
+    if unknown or not names:
+        return api_error(f"Choose models from: {', '.join(analysis.ANALYSES)}")
+    try:
+        params = {"faces": face_params(request.values),
+                  "objects": {"tiled": tiled_param(request.values)}}
+    except ValueError as e:
+        return api_error(str(e))
+
+    def analyze(image, draw, factor=1):
+        return image, analysis.analyze_image(
+            image, names, draw, faces=scale_face_params(params["faces"], factor),
+            objects=params["objects"])
+    return api_response("analyze", analyze, models=",".join(sorted(names)),
+                        tiled=params["objects"]["tiled"], **params["faces"])
+
+
 
 if __name__ == "__main__":
+    # Development server; see wsgi.py and gunicorn.conf.py for production
     os.makedirs("uploads", exist_ok=True)
+    preload(background=app.config["PREFETCH_MODELS"])
     app.run(debug=True)
\ No newline at end of file
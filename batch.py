@@ -0,0 +1,217 @@
+"""Run Lynx models over many images from the command line.
+
+Examples:
+
+    python batch.py photos/ --task object_detection --out objects.jsonl
+    python batch.py "archive/**/*.jpg" --task face_recognition --out people.csv --workers 8
+    python batch.py manifest.txt --task filter --filter cartoon --out run.jsonl --annotated-dir out/
+
+INPUT is a directory (searched recursively), a glob pattern, or a manifest
+file listing one image path per line (a .csv manifest needs a "path"
+column). Re-running with the same --out skips images already recorded
+there, so an interrupted run picks up where it stopped.
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from models.jobs import OPERATIONS, init_worker, run_job
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".webp", ".tif", ".tiff"}
+CSV_FIELDS = ["path", "task", "ok", "elapsed_ms", "annotated", "error", "results"]
+
+
+def collect_inputs(source):
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, name) for name in files)
+    elif os.path.isfile(source) and source.lower().endswith(".csv"):
+        with open(source, newline="") as f:
+            paths = [row["path"] for row in csv.DictReader(f)]
+    elif os.path.isfile(source) and os.path.splitext(source)[1].lower() not in IMAGE_EXTENSIONS:
+        with open(source) as f:
+            paths = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    else:
+        paths = glob.glob(source, recursive=True)
+
+    return sorted(p for p in paths if os.path.splitext(p)[1].lower() in IMAGE_EXTENSIONS)
+
+
+def already_done(out_path):
+    """Paths recorded as successful in an earlier run of the same output file."""
+    if not os.path.exists(out_path):
+        return set()
+    done = set()
+    with open(out_path, newline="") as f:
+        if out_path.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            if str(row.get("ok")) in ("True", "true"):
+                done.add(row["path"])
+    return done
+
+
+class ResultWriter:
+    def __init__(self, out_path):
+        self.csv = out_path.endswith(".csv")
+        new_file = not os.path.exists(out_path) or os.path.getsize(out_path) == 0
+        self._file = open(out_path, "a", newline="")
+        if self.csv:
+            self._writer = csv.DictWriter(self._file, fieldnames=CSV_FIELDS)
+            if new_file:
+                self._writer.writeheader()
+
+    def write(self, record):
+        if self.csv:
+            row = dict(record, results=json.dumps(record["results"]))
+            self._writer.writerow(row)
+        else:
+            self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def annotated_path(annotated_dir, path, task, ext):
+    name = os.path.splitext(os.path.basename(path))[0]
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+    return os.path.join(annotated_dir, f"{name}_{task}_{digest}{ext}")
+
+
+def process(path, data, operation, params):
+    """Worker entry point: time one run_job() call."""
+    start = time.perf_counter()
+    image, results = run_job(operation, data, params)
+    return image, results, (time.perf_counter() - start) * 1000
+
+
+class Progress:
+    def __init__(self, total, every=1.0):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.every = every
+        self.start = time.monotonic()
+        self._last = 0.0
+
+    def update(self, ok):
+        self.done += 1
+        self.failed += not ok
+        now = time.monotonic()
+        if now - self._last >= self.every or self.done == self.total:
+            self._last = now
+            elapsed = now - self.start
+            rate = self.done / elapsed if elapsed else 0.0
+            eta = (self.total - self.done) / rate if rate else 0.0
+            print(f"\r{self.done}/{self.total} done, {self.failed} failed, "
+                  f"{rate:.1f} img/s, ETA {eta:.0f}s", end="", file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-process images with Lynx models")
+    parser.add_argument("input", help="directory, glob pattern or manifest file")
+    parser.add_argument("--task", required=True, choices=sorted(OPERATIONS))
+    parser.add_argument("--filter", default="none", help="filter name for --task filter")
+    parser.add_argument("--param", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra filter parameter, e.g. --param brightness=120")
+    parser.add_argument("--out", required=True, help="results file (.jsonl or .csv)")
+    parser.add_argument("--annotated-dir", help="also write annotated images here")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--prefetch", type=int, default=2,
+                        help="images read ahead per worker")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="process every input even if already in --out")
+    args = parser.parse_args(argv)
+
+    paths = collect_inputs(args.input)
+    if not args.no_resume:
+        done = already_done(args.out)
+        skipped = len(paths)
+        paths = [p for p in paths if p not in done]
+        skipped -= len(paths)
+        if skipped:
+            print(f"Skipping {skipped} already processed image(s)", file=sys.stderr)
+    if not paths:
+        print("Nothing to do", file=sys.stderr)
+        return 0
+
+    params = {}
+    if args.task == "filter":
+        params["filter"] = args.filter
+        for item in args.param:
+            key, _, value = item.partition("=")
+            params[key] = int(value) if value.lstrip("-").isdigit() else value
+    if args.annotated_dir:
+        os.makedirs(args.annotated_dir, exist_ok=True)
+
+    writer = ResultWriter(args.out)
+    progress = Progress(len(paths))
+    window = max(1, args.workers * args.prefetch)
+    pending = {}
+    queue = iter(paths)
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as pool:
+        def refill():
+            # Read files ahead of the workers so each always has input queued
+            while len(pending) < window:
+                path = next(queue, None)
+                if path is None:
+                    return
+                ext = os.path.splitext(path)[1].lower()
+                task_params = dict(params) if args.task == "filter" else {"ext": ext}
+                try:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                except OSError as e:
+                    finish(path, None, e)
+                    continue
+                pending[pool.submit(process, path, data, args.task, task_params)] = path
+
+        def finish(path, future, error=None):
+            record = {"path": path, "task": args.task, "ok": False, "elapsed_ms": None,
+                      "annotated": None, "error": None, "results": None}
+            try:
+                if error is not None:
+                    raise error
+                image, results, elapsed = future.result()
+                record.update(ok=True, results=results, elapsed_ms=round(elapsed, 2))
+                if args.annotated_dir:
+                    ext = ".jpg" if args.task == "filter" else os.path.splitext(path)[1].lower()
+                    target = annotated_path(args.annotated_dir, path, args.task, ext)
+                    with open(target, "wb") as f:
+                        f.write(image)
+                    record["annotated"] = target
+            except Exception as e:
+                record["error"] = str(e)
+            writer.write(record)
+            progress.update(record["ok"])
+
+        try:
+            refill()
+            while pending:
+                completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    finish(pending.pop(future), future)
+                refill()
+        finally:
+            writer.close()
+
+    elapsed = time.monotonic() - progress.start
+    print(f"\nProcessed {progress.done} image(s) in {elapsed:.1f}s "
+          f"({progress.done / elapsed if elapsed else 0:.1f} img/s), {progress.failed} failed",
+          file=sys.stderr)
+    return 1 if progress.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
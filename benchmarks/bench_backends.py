@@ -0,0 +1,184 @@
+"""Accuracy versus latency for every DNN backend and model variant.
+
+Usage: python benchmarks/bench_backends.py [--out backends.json] [--runs 5]
+
+Each model is run on the bundled examples with every backend available in
+this environment (see models.registry.BACKENDS) and every variant whose
+files are present (fp32, fp16, int8, ...). Outputs are compared against
+default/fp32:
+
+  * face, ssd   - precision/recall of detections (same class, IoU >= 0.5)
+                  and mean IoU of the matched boxes
+  * age, gender - top-1 agreement and mean absolute probability difference
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models.face_recognition import MODEL_MEAN_VALUES  # noqa: E402
+from models.registry import available_backends, registry  # noqa: E402
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "static", "assets", "examples")
+THRESHOLDS = {"face": 0.7, "ssd": 0.5}
+
+
+def face_blob(image):
+    return cv2.dnn.blobFromImage(image, 1.0, (300, 300), [104, 117, 123], swapRB=False, crop=False)
+
+
+def ssd_blob(image):
+    return cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 0.007843, (300, 300), 127.5)
+
+
+def crop_blob(crop):
+    return cv2.dnn.blobFromImage(crop, 1.0, (227, 227), MODEL_MEAN_VALUES, swapRB=False)
+
+
+def detections(out, threshold):
+    rows = out.reshape(-1, 7)
+    rows = rows[rows[:, 2] > threshold]
+    return [(int(r[1]), r[3:7]) for r in rows]
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def compare_detections(reference, candidate, threshold):
+    matched, n_ref, n_cand, ious = 0, 0, 0, []
+    for ref_out, cand_out in zip(reference, candidate):
+        ref = detections(ref_out, threshold)
+        cand = detections(cand_out, threshold)
+        n_ref += len(ref)
+        n_cand += len(cand)
+        used = set()
+        for cls, box in ref:
+            best, best_j = 0.0, None
+            for j, (c_cls, c_box) in enumerate(cand):
+                if j in used or c_cls != cls:
+                    continue
+                overlap = iou(box, c_box)
+                if overlap > best:
+                    best, best_j = overlap, j
+            if best_j is not None and best >= 0.5:
+                used.add(best_j)
+                matched += 1
+                ious.append(best)
+    return {
+        "precision": round(matched / n_cand, 4) if n_cand else 1.0,
+        "recall": round(matched / n_ref, 4) if n_ref else 1.0,
+        "mean_iou": round(float(np.mean(ious)), 4) if ious else None,
+    }
+
+
+def compare_classes(reference, candidate):
+    ref = np.concatenate(reference)
+    cand = np.concatenate(candidate)
+    return {
+        "top1_agreement": round(float((ref.argmax(axis=1) == cand.argmax(axis=1)).mean()), 4),
+        "mean_abs_diff": round(float(np.abs(ref - cand).mean()), 6),
+    }
+
+
+def run_net(net, blobs, runs):
+    outputs, samples = [], []
+    for blob in blobs:
+        net.setInput(blob)
+        outputs.append(net.forward().copy())
+    for _ in range(runs):
+        for blob in blobs:
+            start = time.perf_counter()
+            net.setInput(blob)
+            net.forward()
+            samples.append((time.perf_counter() - start) * 1000)
+    return outputs, statistics.median(samples) if samples else None
+
+
+def face_crops(images):
+    """Faces found by the reference detector, or centre crops without it."""
+    crops = []
+    try:
+        net = registry.build("face")
+    except Exception:
+        net = None
+    for image in images:
+        h, w = image.shape[:2]
+        found = []
+        if net is not None:
+            net.setInput(face_blob(image))
+            for _, box in detections(net.forward(), THRESHOLDS["face"]):
+                x1, y1, x2, y2 = (box * [w, h, w, h]).astype(int)
+                crop = image[max(0, y1):max(0, y2), max(0, x1):max(0, x2)]
+                if crop.size:
+                    found.append(crop)
+        if not found:
+            side = min(h, w) // 2
+            found.append(image[h // 2 - side // 2:h // 2 + side // 2, w // 2 - side // 2:w // 2 + side // 2])
+        crops.extend(found)
+    return crops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", help="write the report as JSON")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    images = [cv2.imread(p) for p in sorted(glob.glob(os.path.join(EXAMPLES, "*.jpg")))]
+    crops = face_crops(images)
+    inputs = {
+        "face": [face_blob(i) for i in images],
+        "ssd": [ssd_blob(i) for i in images],
+        "age": [crop_blob(c) for c in crops],
+        "gender": [crop_blob(c) for c in crops],
+    }
+
+    backends = available_backends()
+    report = {"backends": backends, "models": {}}
+    print(f"{'model':<8}{'backend/variant':<26}{'median ms':>10}  accuracy vs default/fp32")
+
+    for name, blobs in inputs.items():
+        try:
+            reference, _ = run_net(registry.build(name), blobs, 0)
+        except Exception as e:
+            print(f"{name:<8}skipped: {e}")
+            report["models"][name] = {"error": str(e)}
+            continue
+
+        rows = {}
+        for variant in registry.available_variants(name):
+            for backend in backends:
+                key = f"{backend}/{variant}"
+                try:
+                    outputs, ms = run_net(registry.build(name, backend, variant), blobs, args.runs)
+                except Exception as e:
+                    rows[key] = {"error": str(e)}
+                    continue
+                if name in THRESHOLDS:
+                    accuracy = compare_detections(reference, outputs, THRESHOLDS[name])
+                else:
+                    accuracy = compare_classes(reference, outputs)
+                rows[key] = dict(median_ms=round(ms, 3), **accuracy)
+                print(f"{name:<8}{key:<26}{ms:>10.2f}  {accuracy}")
+        report["models"][name] = rows
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Time band-parallel filters against whole-image runs.
+
+Usage: python benchmarks/bench_bands.py [--megapixels 12] [--workers 1 2 4 8] [--repeat 3]
+
+For every filter that can run in row bands (models.filters.BAND_HALO plus
+a blurred "adjustable"), prints the median time per worker count and
+checks that the banded output is identical to the whole-image one.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models import bands  # noqa: E402
+from models.filters import BAND_HALO, apply_filter_image  # noqa: E402
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "static", "assets", "examples",
+                       "groupimageface.jpg")
+
+CASES = [(name, {}) for name in BAND_HALO] + [
+    ("adjustable", {"brightness": 110, "contrast": 90, "sepia": 40, "blur": 5}),
+]
+
+
+def median_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    base = cv2.imread(EXAMPLE)
+    h, w = base.shape[:2]
+    scale = (args.megapixels * 1e6 / (h * w)) ** 0.5
+    image = cv2.resize(base, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_CUBIC)
+    workers = sorted(set(args.workers))
+    print(f"{image.shape[1]}x{image.shape[0]}, {os.cpu_count()} CPUs, "
+          f"OpenCV threads {cv2.getNumThreads()}")
+    print(f"{'filter':<14}" + "".join(f"{n:>10}w" for n in workers) + "   identical")
+
+    for name, params in CASES:
+        timings, reference, identical = [], None, True
+        for n in workers:
+            bands.configure(workers=n)
+            seconds, result = median_time(lambda: apply_filter_image(image, name, **params), args.repeat)
+            timings.append(seconds)
+            if reference is None:
+                reference = result
+            identical &= np.array_equal(reference, result)
+        print(f"{name:<14}" + "".join(f"{t * 1000:9.0f}ms" for t in timings) + f"   {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare the cartoon filter's colour quantization modes.
+
+Usage: python benchmarks/bench_cartoon.py [--megapixels 12] [--repeat 3]
+
+For each quality level prints the median time and the mean absolute
+difference from the "exact" output on the bundled examples plus one
+upscaled synthetic image of the requested size.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models.filters import CARTOON_QUALITY, apply_cartoon_effect  # noqa: E402
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "static", "assets", "examples")
+
+
+def load_images(megapixels):
+    images = []
+    for path in sorted(glob.glob(os.path.join(EXAMPLES, "*.jpg"))):
+        images.append((os.path.basename(path), cv2.imread(path)))
+
+    if megapixels:
+        base = images[0][1]
+        h, w = base.shape[:2]
+        scale = (megapixels * 1e6 / (h * w)) ** 0.5
+        big = cv2.resize(base, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_CUBIC)
+        images.append((f"synthetic_{megapixels}mp", big))
+
+    return images
+
+
+def time_call(fn, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    modes = list(CARTOON_QUALITY)
+    print(f"{'image':<24}{'pixels':>12}" + "".join(f"{m + ' ms':>16}{m + ' diff':>16}" for m in modes))
+
+    for name, image in load_images(args.megapixels):
+        row = f"{name:<24}{image.shape[0] * image.shape[1]:>12}"
+        exact_ms, exact = time_call(lambda: apply_cartoon_effect(image, "exact"), 1)
+        for mode in modes:
+            if mode == "exact":
+                ms, out = exact_ms, exact
+            else:
+                ms, out = time_call(lambda: apply_cartoon_effect(image, mode), args.repeat)
+            diff = np.abs(out.astype(np.int16) - exact).mean()
+            row += f"{ms:>16.1f}{diff:>16.2f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Startup time and steady-state memory of the production server.
+
+Usage: python benchmarks/bench_startup.py [--workers 4] [--requests 20] [--out startup.json]
+
+First, in a fresh interpreter, it times `import app` and the first and
+second request to each /api/v1 route, which is where lazily loaded models
+pay their loading cost.
+
+Then it starts gunicorn with gunicorn.conf.py twice, with and without
+preload_app. For each run it reports:
+  * seconds until /readyz answers 200
+  * RSS and PSS of the master and every worker after --requests warm
+    requests. PSS splits shared pages between processes, so it shows how
+    much of the model weights the preloaded workers share copy-on-write.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+EXAMPLE = os.path.join(ROOT, "static", "assets", "examples", "groupimageface.jpg")
+
+
+COLD_START = r"""
+import json, sys, time
+start = time.perf_counter()
+import app
+report = {"import_seconds": round(time.perf_counter() - start, 3), "requests_ms": {}}
+client = app.app.test_client()
+with open(sys.argv[1], "rb") as f:
+    image = f.read()
+for route in ("face-detection", "face-recognition", "object-detection", "filters/sepia"):
+    timings = []
+    for i in range(2):
+        # A trailing byte changes the cache key without changing the image
+        t0 = time.perf_counter()
+        status = client.post(f"/api/v1/{route}?image=url", data=image + b"\0" * i,
+                             content_type="image/jpeg").status_code
+        timings.append(round((time.perf_counter() - t0) * 1000, 1))
+    report["requests_ms"][route] = {"status": status, "first": timings[0], "second": timings[1]}
+print(json.dumps(report))
+"""
+
+
+def cold_start():
+    """Import time and first/second request latency in a fresh process."""
+    out = subprocess.run([sys.executable, "-c", COLD_START, EXAMPLE], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def memory(pid):
+    """(rss, pss) in bytes from /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1]] = int(parts[1]) * 1024
+    return values.get("Rss", 0), values.get("Pss", 0)
+
+
+def children(pid):
+    found = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        found.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    return found
+
+
+def wait_ready(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.05)
+    return False
+
+
+def run(workers, preload, requests, port, timeout):
+    env = dict(os.environ, LYNX_WORKERS=str(workers), LYNX_PRELOAD="1" if preload else "0",
+               LYNX_BIND=f"127.0.0.1:{port}")
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(base + "/readyz", timeout):
+            return {"error": "server did not become ready"}
+        ready = time.perf_counter() - start
+
+        with open(EXAMPLE, "rb") as f:
+            image = f.read()
+        for _ in range(requests):
+            request = urllib.request.Request(
+                base + "/api/v1/face-detection?image=none", data=image,
+                headers={"Content-Type": "image/jpeg"})
+            urllib.request.urlopen(request, timeout=60).read()
+
+        processes = {"master": memory(server.pid)}
+        for i, pid in enumerate(sorted(children(server.pid))):
+            processes[f"worker{i}"] = memory(pid)
+        return {
+            "preload": preload,
+            "workers": workers,
+            "ready_seconds": round(ready, 3),
+            "processes_mb": {name: {"rss": round(rss / 2 ** 20, 1), "pss": round(pss / 2 ** 20, 1)}
+                             for name, (rss, pss) in processes.items()},
+            "total_pss_mb": round(sum(pss for _, pss in processes.values()) / 2 ** 20, 1),
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--out", help="write the report as JSON")
+    args = parser.parse_args()
+
+    cold = cold_start()
+    print(f"import app: {cold['import_seconds']:.2f}s")
+    for route, r in cold["requests_ms"].items():
+        print(f"    {route:<18} HTTP {r['status']}  first {r['first']:8.1f} ms  second {r['second']:8.1f} ms")
+
+    report = [run(args.workers, preload, args.requests, args.port, args.timeout)
+              for preload in (True, False)]
+    for result in report:
+        if "error" in result:
+            print(f"preload={result.get('preload')}: {result['error']}")
+            continue
+        print(f"preload={result['preload']!s:<6} ready in {result['ready_seconds']:6.2f}s  "
+              f"total PSS {result['total_pss_mb']:7.1f} MB")
+        for name, mem in result["processes_mb"].items():
+            print(f"    {name:<9} RSS {mem['rss']:7.1f} MB  PSS {mem['pss']:7.1f} MB")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"cold_start": cold, "servers": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
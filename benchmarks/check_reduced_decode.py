@@ -0,0 +1,108 @@
+"""Check that image=none API answers match image=url ones.
+
+Usage: python benchmarks/check_reduced_decode.py [--scale 6] [--min-iou 0.5]
+
+With image=none the API decodes large uploads at reduced size and maps
+boxes back, so results should match the full decode. This posts the group
+photo, upscaled --scale times, to each box-returning route in both modes
+(with and without face size limits) and exits non-zero when the box counts
+differ or a box has no match of at least --min-iou. Routes whose model
+files are missing are skipped.
+"""
+import argparse
+import os
+import sys
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "static", "assets", "examples",
+                       "groupimageface.jpg")
+
+CASES = [
+    "/api/v1/face-detection",
+    "/api/v1/face-detection?min_size=300",
+    "/api/v1/face-detection?min_size=300&max_size=500",
+    "/api/v1/face-recognition",
+    "/api/v1/object-detection?tiled=0",
+    "/api/v1/analyze?models=faces,people,objects&min_size=300&tiled=0",
+]
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def boxes(results, path=""):
+    """{path: [box, ...]} for every list of boxes in a results dict."""
+    found = {}
+    if isinstance(results, dict):
+        for key, value in results.items():
+            found.update(boxes(value, f"{path}.{key}" if path else key))
+    elif isinstance(results, list) and results and isinstance(results[0], dict) and "box" in results[0]:
+        found[path] = [item["box"] for item in results]
+    return found
+
+
+def compare(full, reduced, min_iou):
+    """Problems found comparing two {path: boxes} maps."""
+    problems = []
+    for path in sorted(set(full) | set(reduced)):
+        a, b = full.get(path, []), reduced.get(path, [])
+        if len(a) != len(b):
+            problems.append(f"{path}: {len(a)} boxes with image=url, {len(b)} with image=none")
+            continue
+        unused = list(b)
+        for box in a:
+            best = max(unused, key=lambda other: iou(box, other), default=None)
+            if best is None or iou(box, best) < min_iou:
+                problems.append(f"{path}: no match for {box}")
+            else:
+                unused.remove(best)
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=6)
+    parser.add_argument("--min-iou", type=float, default=0.5)
+    args = parser.parse_args()
+
+    from app import app
+
+    image = cv2.imread(EXAMPLE)
+    image = cv2.resize(image, None, fx=args.scale, fy=args.scale, interpolation=cv2.INTER_CUBIC)
+    data = cv2.imencode(".jpg", image)[1].tobytes()
+    print(f"{image.shape[1]}x{image.shape[0]} JPEG, {len(data) / 2 ** 20:.1f} MB")
+
+    client = app.test_client()
+    failed = False
+    for case in CASES:
+        separator = "&" if "?" in case else "?"
+        answers = [client.post(f"{case}{separator}image={mode}", data=data, content_type="image/jpeg")
+                   for mode in ("url", "none")]
+        if any(r.status_code == 503 for r in answers):
+            print(f"SKIP {case}: model files missing")
+            continue
+        if any(r.status_code != 200 for r in answers):
+            print(f"FAIL {case}: HTTP {[r.status_code for r in answers]}")
+            failed = True
+            continue
+        full, reduced = (boxes(r.get_json()["results"]) for r in answers)
+        problems = compare(full, reduced, args.min_iou)
+        counts = ", ".join(f"{path}={len(found)}" for path, found in sorted(full.items()))
+        print(f"{'FAIL' if problems else 'ok  '} {case}: {counts}")
+        for problem in problems:
+            print(f"       {problem}")
+        failed |= bool(problems)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
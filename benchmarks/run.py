@@ -0,0 +1,262 @@
+"""Benchmark harness for every model and filter in models/.
+
+Run the suite and write machine-readable results:
+
+    python benchmarks/run.py run --out results.json
+    python benchmarks/run.py run --sizes 0.3,2 --only filter:cartoon,detect_objects
+
+Compare two runs and exit non-zero when anything got slower than allowed:
+
+    python benchmarks/run.py compare baseline.json results.json --threshold 10
+
+Inputs are the bundled static/assets/examples/*.jpg plus synthetic images
+(the group photo resized to each --sizes megapixel count). Every workload
+goes bytes-in/bytes-out through the *_bytes functions, so the per-stage
+timings (decode, preprocess, forward, postprocess, draw, filter, encode)
+come from the same stage hooks the app uses.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models.filters import FILTERS  # noqa: E402
+from models.metrics import current_rss  # noqa: E402
+from models.stages import record_stages  # noqa: E402
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "static", "assets", "examples")
+SYNTHETIC_BASE = os.path.join(EXAMPLES, "groupimageface.jpg")
+
+ADJUSTABLE_PARAMS = {"brightness": 120, "contrast": 110, "sepia": 40, "blur": 2}
+
+
+def workloads():
+    """name -> callable(bytes). Imports are lazy so one broken model only
+    fails its own workloads."""
+    def face_detection(data):
+        from models.face_detection import detect_faces_bytes
+        return detect_faces_bytes(data)
+
+    def face_recognition(data):
+        from models.face_recognition import recognize_faces_bytes
+        return recognize_faces_bytes(data)
+
+    def object_detection(data):
+        from models.object_detection import detect_objects_bytes
+        return detect_objects_bytes(data)
+
+    def make_filter(name):
+        def run(data):
+            from models.filters import apply_filter_bytes
+            params = ADJUSTABLE_PARAMS if name == "adjustable" else {}
+            return apply_filter_bytes(data, name, **params)
+        return run
+
+    jobs = {
+        "detect_faces": face_detection,
+        "recognize_faces": face_recognition,
+        "detect_objects": object_detection,
+    }
+    for name in FILTERS:
+        jobs[f"filter:{name}"] = make_filter(name)
+    return jobs
+
+
+def load_inputs(sizes):
+    """(name, megapixels, jpeg bytes) for the examples and synthetic sizes."""
+    inputs = []
+    for path in sorted(glob.glob(os.path.join(EXAMPLES, "*.jpg"))):
+        with open(path, "rb") as f:
+            data = f.read()
+        h, w = cv2.imread(path).shape[:2]
+        inputs.append((os.path.basename(path), round(h * w / 1e6, 2), data))
+
+    base = cv2.imread(SYNTHETIC_BASE)
+    h, w = base.shape[:2]
+    for mp in sizes:
+        scale = (mp * 1e6 / (h * w)) ** 0.5
+        image = cv2.resize(base, (max(1, int(w * scale)), max(1, int(h * scale))),
+                           interpolation=cv2.INTER_CUBIC)
+        ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        inputs.append((f"synthetic_{mp}mp", mp, buf.tobytes()))
+    return inputs
+
+
+class RssSampler:
+    """Samples RSS in the background to find the peak during a workload."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else None
+
+
+def run_workload(fn, data, repeat, warmup):
+    for _ in range(warmup):
+        fn(data)
+
+    latencies = []
+    stage_totals = {}
+    baseline = current_rss()
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            with record_stages() as stages:
+                fn(data)
+            latencies.append(time.perf_counter() - t0)
+            for name, seconds in stages.items():
+                stage_totals[name] = stage_totals.get(name, 0.0) + seconds
+        elapsed = time.perf_counter() - start
+
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p90_ms": percentile(latencies, 90),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": float(np.mean(latencies)) * 1000,
+        "throughput_per_s": repeat / elapsed if elapsed else None,
+        "peak_rss_mb": rss.peak / 2 ** 20,
+        "peak_rss_delta_mb": (rss.peak - baseline) / 2 ** 20,
+        "stages_ms": {k: v / repeat * 1000 for k, v in sorted(stage_totals.items())},
+    }
+
+
+def cmd_run(args):
+    cv2.setRNGSeed(0)
+    np.random.seed(0)
+
+    sizes = [float(s) for s in args.sizes.split(",") if s]
+    inputs = load_inputs(sizes)
+    if args.examples == "none":
+        inputs = [i for i in inputs if i[0].startswith("synthetic_")]
+
+    jobs = workloads()
+    if args.only:
+        wanted = set(args.only.split(","))
+        jobs = {k: v for k, v in jobs.items() if k in wanted}
+
+    results = []
+    for job_name, fn in jobs.items():
+        for input_name, mp, data in inputs:
+            try:
+                stats = run_workload(fn, data, args.repeat, args.warmup)
+            except Exception as e:
+                print(f"{job_name:<24}{input_name:<24} skipped: {e}")
+                results.append({"workload": job_name, "input": input_name,
+                                "megapixels": mp, "error": str(e)})
+                continue
+            print(f"{job_name:<24}{input_name:<24}"
+                  f"p50 {stats['p50_ms']:9.1f} ms  p99 {stats['p99_ms']:9.1f} ms  "
+                  f"{stats['throughput_per_s']:7.2f}/s  rss {stats['peak_rss_mb']:7.1f} MB")
+            results.append(dict(workload=job_name, input=input_name, megapixels=mp, **stats))
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "cv_threads": cv2.getNumThreads(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.out}")
+
+
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    def index(report):
+        return {(r["workload"], r["input"]): r for r in report["results"] if "error" not in r}
+
+    old, new = index(baseline), index(current)
+    regressions = 0
+    print(f"{'workload':<24}{'input':<24}{'base ' + args.metric:>16}{'new':>12}{'change':>10}")
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key][args.metric], new[key][args.metric]
+        if not before:
+            continue
+        change = (after - before) / before * 100
+        # Higher is better for throughput, lower for everything else
+        worse = -change if args.metric == "throughput_per_s" else change
+        flag = "  REGRESSION" if worse > args.threshold else ""
+        regressions += bool(flag)
+        print(f"{key[0]:<24}{key[1]:<24}{before:>16.2f}{after:>12.2f}{change:>+9.1f}%{flag}")
+
+    missing = sorted(old.keys() - new.keys())
+    for key in missing:
+        print(f"{key[0]:<24}{key[1]:<24} missing from current run")
+
+    print(f"{regressions} regression(s) over {args.threshold}% on {args.metric}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lynx benchmark suite")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run the benchmarks")
+    run.add_argument("--out", default="bench_results.json")
+    run.add_argument("--sizes", default="0.3,2,8,24",
+                     help="comma-separated synthetic image sizes in megapixels")
+    run.add_argument("--examples", choices=["all", "none"], default="all",
+                     help="include the bundled example images")
+    run.add_argument("--only", help="comma-separated workload names, e.g. filter:cartoon")
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--warmup", type=int, default=1)
+
+    compare = sub.add_parser("compare", help="compare two result files")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--metric", default="p50_ms",
+                         choices=["p50_ms", "p90_ms", "p99_ms", "mean_ms",
+                                  "throughput_per_s", "peak_rss_mb"])
+    compare.add_argument("--threshold", type=float, default=10.0,
+                         help="allowed slowdown in percent")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        cmd_run(args)
+        return 0
+    return cmd_compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""gunicorn settings for Lynx: gunicorn -c gunicorn.conf.py wsgi:app
+
+Layout: one worker process by default, running OpenCV on every core, with
+LYNX_THREADS request threads that let the batch scheduler merge concurrent
+requests and keep streams from blocking each other.
+
+Results (/results/<key>), preview sessions, jobs and streams live in the
+memory of the worker that created them, so a follow-up request has to
+reach the same process. Only raise LYNX_WORKERS behind a proxy with sticky
+routing; OpenCV threads are then split so workers x cv threads ~= cores.
+For the same reason workers are not recycled unless LYNX_MAX_REQUESTS is
+set. Every setting can be overridden from the environment.
+"""
+import os
+
+cpus = os.cpu_count() or 1
+
+bind = os.environ.get("LYNX_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("LYNX_WORKERS", 1))
+cv_threads = int(os.environ.get("LYNX_CV_THREADS", max(1, cpus // workers)))
+worker_class = "gthread"
+threads = int(os.environ.get("LYNX_THREADS", max(4, cpus)))
+preload_app = os.environ.get("LYNX_PRELOAD", "1") != "0"
+timeout = int(os.environ.get("LYNX_TIMEOUT", 120))
+graceful_timeout = 30
+# Recycling bounds slow leaks in native code but drops in-memory results,
+# previews, jobs and streams, so it is opt-in
+max_requests = int(os.environ.get("LYNX_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+
+
+def post_fork(server, worker):
+    import cv2
+    from app import bands, jobs
+
+    cv2.setNumThreads(cv_threads)
+    # Filter bands share the same per-worker slice of the cores
+    bands.configure(workers=cv_threads)
+    # Background job processes are per worker too; split the cores between them
+    jobs.max_workers = max(1, cpus // workers)
+    server.log.info("Worker %s: %d OpenCV threads, %d job processes",
+                    worker.pid, cv_threads, jobs.max_workers)
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from models.perprocess import PerProcess
+from models.stages import stage, traced
+
+# Models /api/v1/analyze can combine. "faces" is the Haar cascade, "people"
+# the DNN face detector plus age/gender, "objects" MobileNet-SSD.
+ANALYSES = ("faces", "people", "objects")
+
+SETTINGS = {"workers": 3}
+
+_pool = PerProcess(lambda: ThreadPoolExecutor(max_workers=SETTINGS["workers"],
+                                             thread_name_prefix="analyze"))
+
+
+def configure(workers=None):
+    if workers is not None:
+        SETTINGS["workers"] = max(1, int(workers))
+        _pool.reset()
+
+
+def _faces(image, resized, params):
+    from models.face_detection import detect_faces_image
+    faces = detect_faces_image(image, draw=False, **params.get("faces", {}))
+    return faces, {
+        "count": len(faces),
+        "faces": [{"box": [int(x), int(y), int(x + w), int(y + h)]} for x, y, w, h in faces]
+    }
+
+
+def _people(image, resized, params):
+    from models.face_recognition import recognize_faces_image
+    people = recognize_faces_image(image, draw=False, resized=resized)
+    return people, {"count": len(people), "people": people}
+
+
+def _objects(image, resized, params):
+    from models.object_detection import detect_objects_image
+    result = detect_objects_image(image, draw=False, resized=resized,
+                                  **params.get("objects", {}))
+    return result["detections"], result
+
+
+RUNNERS = {"faces": _faces, "people": _people, "objects": _objects}
+
+
+def draw_analysis(image, drawables):
+    from models.face_detection import draw_faces
+    from models.face_recognition import draw_people
+    from models.object_detection import draw_detections
+
+    # Objects first so face labels stay readable on top
+    if "objects" in drawables:
+        draw_detections(image, drawables["objects"])
+    if "faces" in drawables:
+        draw_faces(image, drawables["faces"])
+    if "people" in drawables:
+        draw_people(image, drawables["people"])
+
+
+@traced("analyze")
+def analyze_image(image, analyses=ANALYSES, draw=True, **params):
+    """Run several models on one decoded image and merge their results.
+
+    The face DNN and MobileNet-SSD both take a 300x300 input, so the image is
+    resized once and the models run concurrently on a shared thread pool.
+    Drawing happens afterwards on the calling thread, in place. A model that
+    fails reports {"error": ...} without failing the others. params holds
+    per-model keyword arguments, e.g. faces={"min_size": 40}.
+    """
+    analyses = [name for name in ANALYSES if name in analyses]
+    resized = None
+    if "people" in analyses or "objects" in analyses:
+        with stage("preprocess"):
+            resized = cv2.resize(image, (300, 300))
+
+    futures = {name: _pool.get().submit(RUNNERS[name], image, resized, params)
+               for name in analyses}
+
+    results, drawables = {}, {}
+    with stage("forward"):
+        for name, future in futures.items():
+            try:
+                drawables[name], results[name] = future.result()
+            except Exception as e:
+                print(f"Error during {name} analysis: {e}")
+                results[name] = {"error": str(e)}
+
+    if draw:
+        with stage("draw"):
+            draw_analysis(image, drawables)
+    return results
@@ -0,0 +1,70 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from models.perprocess import PerProcess
+
+# Images below min_pixels run whole; splitting costs more than it saves.
+# Bands are at least min_rows tall (and taller than their two halos).
+SETTINGS = {"workers": os.cpu_count() or 1, "min_pixels": 1_000_000, "min_rows": 64}
+
+_pool = PerProcess(lambda: ThreadPoolExecutor(max_workers=SETTINGS["workers"],
+                                             thread_name_prefix="bands"))
+
+
+def configure(workers=None, min_pixels=None, min_rows=None):
+    if workers is not None:
+        SETTINGS["workers"] = max(1, int(workers))
+        _pool.reset()
+    if min_pixels is not None:
+        SETTINGS["min_pixels"] = int(min_pixels)
+    if min_rows is not None:
+        SETTINGS["min_rows"] = max(1, int(min_rows))
+
+
+def split_bands(rows, count, halo=0):
+    """count horizontal bands covering rows, as (start, stop, lo, hi).
+
+    start:stop are the rows a band produces; lo:hi adds up to halo rows of
+    context on each side, clipped to the image.
+    """
+    edges = np.linspace(0, rows, count + 1).astype(int)
+    return [(start, stop, max(0, start - halo), min(rows, stop + halo))
+            for start, stop in zip(edges[:-1], edges[1:])]
+
+
+def band_count(shape, halo=0, workers=None):
+    """How many bands run_bands would use for an image of this shape."""
+    workers = SETTINGS["workers"] if workers is None else workers
+    rows, cols = shape[:2]
+    if workers < 2 or rows * cols < SETTINGS["min_pixels"]:
+        return 1
+    return max(1, min(workers, rows // max(SETTINGS["min_rows"], 2 * halo + 1)))
+
+
+def run_bands(func, image, halo=0, workers=None):
+    """func(image), computed on horizontal bands in parallel and stitched.
+
+    func must be local: each output row may depend only on input rows at
+    most halo away, e.g. a convolution with kernel radius halo. Pixels at
+    the true image edge see the same border handling as a whole-image call,
+    so the result is identical. Bands are row views of image, so nothing is
+    copied going in; each band's own rows are copied into one preallocated
+    output. OpenCV and large NumPy operations release the GIL, so the bands
+    really run side by side.
+    """
+    count = band_count(image.shape, halo, workers)
+    if count < 2:
+        return func(image)
+
+    bands = split_bands(image.shape[0], count, halo)
+    futures = [_pool.get().submit(func, image[lo:hi]) for _, _, lo, hi in bands]
+
+    out = None
+    for (start, stop, lo, _), future in zip(bands, futures):
+        result = future.result()
+        if out is None:
+            out = np.empty((image.shape[0],) + result.shape[1:], result.dtype)
+        out[start:stop] = result[start - lo:stop - lo]
+    return out
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def make_key(data, operation, **params):
+    """Content address for an operation: hash of the input plus its settings."""
+    h = hashlib.sha256(data)
+    h.update(operation.encode())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Two-tier cache of (encoded image, JSON-able results) by content key.
+
+    The memory tier is an LRU bounded by max_bytes. When disk_dir is set, every
+    entry is also written there and the tier is trimmed oldest-first to
+    disk_max_bytes; disk hits are promoted back into memory.
+    """
+
+    def __init__(self, max_bytes=128 * 1024 * 1024, disk_dir=None,
+                 disk_max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._disk_size = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_size = sum(size for _, size, _ in self._disk_entries())
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self._counters["hits"] += 1
+                self._counters["memory_hits"] += 1
+                return item
+
+        item = self._disk_get(key)
+        with self._lock:
+            if item is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["hits"] += 1
+            self._counters["disk_hits"] += 1
+            self._memory_put(key, item)
+        return item
+
+    def put(self, key, image, meta):
+        item = (image, meta)
+        with self._lock:
+            self._memory_put(key, item)
+        if self.disk_dir:
+            self._disk_put(key, item)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._items)
+            stats["bytes"] = self._size
+            stats["disk_bytes"] = self._disk_size
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    # Memory tier (caller holds the lock)
+
+    def _memory_put(self, key, item):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._size -= len(old[0])
+        self._items[key] = item
+        self._size += len(item[0])
+        while self._size > self.max_bytes and len(self._items) > 1:
+            _, (image, _) = self._items.popitem(last=False)
+            self._size -= len(image)
+
+    # Disk tier
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".bin")
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                header = f.readline()
+                image = f.read()
+            os.utime(path)  # keep recently used entries at the back of the queue
+        except OSError:
+            return None
+        return image, json.loads(header)
+
+    def _disk_put(self, key, item):
+        image, meta = item
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # One JSON header line followed by the encoded image, written atomically
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(meta).encode() + b"\n")
+            f.write(image)
+        size = os.path.getsize(tmp)
+        existing = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._disk_size += size - existing
+            over = self._disk_size > self.disk_max_bytes
+        if over:
+            self._disk_trim()
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".bin"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def _disk_trim(self):
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        with self._lock:
+            self._disk_size = total
@@ -1,51 +1,170 @@
+import threading
+
 import cv2
+import numpy as np
+
+from models.imageio import decode_image, encode_image
+from models.stages import stage, traced
 
 cascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-face_cascade = cv2.CascadeClassifier(cascade_path)
 
-if face_cascade.empty():
-    raise IOError("Could not load the face cascade classifier.")
+# Loaded on first use so a missing cascade only breaks face detection
+_cascade = None
+_cascade_error = None
+_cascade_lock = threading.Lock()
 
-def detect_faces(image_path: str, output_path: str) -> int:
-    # Read Image
-    image = cv2.imread(image_path)
-    
-    # Check if the image was read successfully
-    if image is None:
-        print(f"Error: Could not read image at {image_path}. Skipping.")
-        return 0 
 
-    # Preprocessing
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-     
-    # Equalize histogram for better detection in varying lighting
-    gray = cv2.equalizeHist(gray) 
+def load_cascade():
+    """Return the Haar cascade, loading it on first call.
+
+    Raises FileNotFoundError (an IOError) when it cannot be loaded; the next
+    call tries again.
+    """
+    global _cascade, _cascade_error
+    if _cascade is not None:
+        return _cascade
+    with _cascade_lock:
+        if _cascade is None:
+            cascade = cv2.CascadeClassifier(cascade_path)
+            if cascade.empty():
+                _cascade_error = f"Could not load the face cascade classifier: {cascade_path}"
+                raise FileNotFoundError(_cascade_error)
+            _cascade, _cascade_error = cascade, None
+    return _cascade
+
+
+def cascade_health():
+    return {"loaded": _cascade is not None, "error": _cascade_error}
+
+
+# Detection runs on a grayscale copy whose longest side is at most
+# max_side, so the cascade pyramid depth no longer grows with upload size.
+# min_size/max_size are in original-image pixels. With prepass the res10
+# DNN face model is run first and the cascade is skipped when it sees nothing.
+SETTINGS = {
+    "max_side": 1024,
+    "scale_factor": 1.1,
+    "min_neighbors": 5,
+    "min_size": 30,
+    "max_size": None,
+    "prepass": False,
+    "prepass_threshold": 0.3,
+}
+
+
+def configure(**settings):
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown face detection settings: {sorted(unknown)}")
+    SETTINGS.update(settings)
+
+
+def has_faces(image, threshold):
+    """Cheap DNN check used to skip the cascade on images without faces."""
+    from models.scheduler import infer
+
+    blob = cv2.dnn.blobFromImage(image, 1.0, (300, 300),
+                                 [104, 117, 123], swapRB=False, crop=False)
+    detections = infer("face", blob)
+    return bool((detections[0, 0, :, 2] > threshold).any())
+
+
+@traced("face_detection")
+def detect_faces_image(image, draw=True, **params):
+    """Detect faces in a BGR array and, if draw, mark them in place.
+
+    params override SETTINGS for this call. Returns the boxes as (x, y, w, h)
+    in original-image coordinates.
+    """
+    settings = dict(SETTINGS, **params)
+    cascade = load_cascade()
+    h, w = image.shape[:2]
+
+    if settings["prepass"]:
+        with stage("prepass"):
+            try:
+                found = has_faces(image, settings["prepass_threshold"])
+            except Exception as e:
+                # Missing DNN weights should not break cascade detection
+                print(f"Warning: face pre-pass unavailable: {e}")
+                found = True
+        if not found:
+            return np.empty((0, 4), dtype=int)
+
+    with stage("preprocess"):
+        # Preprocessing
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        # Downscale large images before building the pyramid
+        scale = min(1.0, settings["max_side"] / max(h, w))
+        if scale < 1.0:
+            gray = cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))),
+                              interpolation=cv2.INTER_AREA)
+
+        # Equalize histogram for better detection in varying lighting
+        gray = cv2.equalizeHist(gray)
+
+    min_side = max(1, round(settings["min_size"] * scale))
+    max_side = round(settings["max_size"] * scale) if settings["max_size"] else 0
 
     # Detect Faces
-    # Tuned parameters for potentially better results
-    faces = face_cascade.detectMultiScale(
-        gray, 
-        scaleFactor=1.1,         
-        minNeighbors=5,          
-        minSize=(30, 30),       
-        flags=cv2.CASCADE_SCALE_IMAGE
-    )
-
-    # Draw Rectangles
-    RECT_COLOR = (0, 255, 0)  
-    RECT_THICKNESS = 2        
+    with stage("forward"):
+        faces = cascade.detectMultiScale(
+            gray,
+            scaleFactor=settings["scale_factor"],
+            minNeighbors=settings["min_neighbors"],
+            minSize=(min_side, min_side),
+            maxSize=(max_side, max_side),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+
+    # Map boxes back to the original resolution
+    faces = np.round(np.asarray(faces, dtype=np.float64).reshape(-1, 4) / scale).astype(int)
+
+    if draw:
+        with stage("draw"):
+            draw_faces(image, faces)
+
+    return faces
+
+
+def draw_faces(image, faces):
+    """Draw (x, y, w, h) face boxes on image in place."""
+    RECT_COLOR = (0, 255, 0)
+    RECT_THICKNESS = 2
 
     for (x, y, w, h) in faces:
         # Draw on the original color image
-        cv2.rectangle(image, (x, y), (x + w, y + h), RECT_COLOR, RECT_THICKNESS)  
+        cv2.rectangle(image, (x, y), (x + w, y + h), RECT_COLOR, RECT_THICKNESS)
+
+
+def detect_faces(image_path: str, output_path: str, **params) -> int:
+    # Read Image
+    with stage("read"):
+        image = cv2.imread(image_path)
+
+    # Check if the image was read successfully
+    if image is None:
+        print(f"Error: Could not read image at {image_path}. Skipping.")
+        return 0
+
+    faces = detect_faces_image(image, **params)
 
     # Save Result
     try:
-        cv2.imwrite(output_path, image)
+        with stage("write"):
+            cv2.imwrite(output_path, image)
     except cv2.error as e:
         print(f"Error: Could not save image to {output_path}. Details: {e}")
         return 0 # Indicate failure or no faces counted
 
     # Return Face Count
     print(f"Detected {len(faces)} face(s) and saved result to {output_path}")
-    return len(faces)
\ No newline at end of file
+    return len(faces)
+
+
+def detect_faces_bytes(data: bytes, ext: str = ".jpg", **params):
+    """In-memory variant of detect_faces. Returns (encoded_image, face_count)."""
+    image = decode_image(data)
+    faces = detect_faces_image(image, **params)
+    return encode_image(image, ext), len(faces)
@@ -1,25 +1,9 @@
 import cv2
-import os
 
-BASE_DIR = os.path.dirname(__file__)   # models/
-PRETRAINED_DIR = os.path.join(BASE_DIR, "pretrained")
-
-# Face detection model
-FACE_PROTO = os.path.join(PRETRAINED_DIR, "opencv_face_detector.pbtxt")
-FACE_MODEL = os.path.join(PRETRAINED_DIR, "opencv_face_detector_uint8.pb")
-
-# Age model
-AGE_PROTO = os.path.join(PRETRAINED_DIR, "age_deploy.prototxt")
-AGE_MODEL = os.path.join(PRETRAINED_DIR, "age_net.caffemodel")
-
-# Gender model
-GENDER_PROTO = os.path.join(PRETRAINED_DIR, "gender_deploy.prototxt")
-GENDER_MODEL = os.path.join(PRETRAINED_DIR, "gender_net.caffemodel")
-
-# Load networks
-faceNet = cv2.dnn.readNet(FACE_MODEL, FACE_PROTO)
-ageNet = cv2.dnn.readNet(AGE_MODEL, AGE_PROTO)
-genderNet = cv2.dnn.readNet(GENDER_MODEL, GENDER_PROTO)
+from models.imageio import decode_image, encode_image
+from models.postprocess import detections
+from models.scheduler import infer
+from models.stages import stage, traced
 
 # Categories
 AGE_BUCKETS = ['(0-2)', '(4-6)', '(8-12)', '(15-20)',
@@ -28,55 +12,115 @@ GENDER_LIST = ['Male', 'Female']
 
 MODEL_MEAN_VALUES = (78.4263377603, 87.7689143744, 114.895847746)
 
+# Faces per age/gender forward pass; bounds blob memory on crowd photos
+FACE_BATCH_SIZE = 16
 
-def recognize_faces(image_path: str, output_path: str):
-    # Load image
-    image = cv2.imread(image_path)
-    h, w = image.shape[:2]
 
-    # Prepare input blob for face detection
-    blob = cv2.dnn.blobFromImage(image, 1.0, (300, 300),
-                                 [104, 117, 123], swapRB=False, crop=False)
-    faceNet.setInput(blob)
-    detections = faceNet.forward()
+def predict_age_gender(faces, batch_size=FACE_BATCH_SIZE):
+    """Run age and gender on a list of face crops, batch_size at a time.
+
+    Returns two lists (genders, ages) aligned with faces.
+    """
+    genders, ages = [], []
+    batch_size = max(1, int(batch_size))
+
+    for start in range(0, len(faces), batch_size):
+        chunk = faces[start:start + batch_size]
+
+        # One blob holding every crop in the chunk
+        with stage("preprocess"):
+            face_blob = cv2.dnn.blobFromImages(
+                chunk, 1.0, (227, 227), MODEL_MEAN_VALUES, swapRB=False)
+
+        with stage("forward"):
+            gender_preds = infer("gender", face_blob)
+            age_preds = infer("age", face_blob)
+
+        genders.extend(GENDER_LIST[i] for i in gender_preds.argmax(axis=1))
+        ages.extend(AGE_BUCKETS[i] for i in age_preds.argmax(axis=1))
+
+    return genders, ages
 
-    people = []
 
-    for i in range(detections.shape[2]):
-        confidence = detections[0, 0, i, 2]
-        if confidence > 0.7:  # filter weak detections
-            x1 = int(detections[0, 0, i, 3] * w)
-            y1 = int(detections[0, 0, i, 4] * h)
-            x2 = int(detections[0, 0, i, 5] * w)
-            y2 = int(detections[0, 0, i, 6] * h)
+@traced("face_recognition")
+def recognize_faces_image(image, batch_size=FACE_BATCH_SIZE, draw=True, resized=None):
+    """Detect faces in a BGR array, predict age/gender and, if draw, annotate
+    in place.
 
+    resized may hold the image already scaled to 300x300 (see models.analysis).
+    """
+    h, w = image.shape[:2]
+
+    # Prepare input blob for face detection
+    with stage("preprocess"):
+        blob = cv2.dnn.blobFromImage(image if resized is None else resized, 1.0, (300, 300),
+                                     [104, 117, 123], swapRB=False, crop=False)
+    with stage("forward"):
+        raw = infer("face", blob)
+
+    boxes = []
+    scores = []
+    faces = []
+
+    with stage("postprocess"):
+        # filter weak detections, scale and clamp every box in one go
+        _, confidences, pixel_boxes = detections(raw, 0.7, w, h)
+        for (x1, y1, x2, y2), confidence in zip(pixel_boxes.tolist(), confidences.tolist()):
             # Extract face
             face = image[max(0, y1-15):min(y2+15, h-1),
                          max(0, x1-15):min(x2+15, w-1)]
+            if face.size == 0:
+                continue
+
+            boxes.append((x1, y1, x2, y2))
+            scores.append(confidence)
+            faces.append(face)
+
+    # Predict age & gender for all faces at once
+    genders, ages = predict_age_gender(faces, batch_size)
+
+    people = []
 
-            # Blob for age & gender
-            face_blob = cv2.dnn.blobFromImage(
-                face, 1.0, (227, 227), MODEL_MEAN_VALUES, swapRB=False)
+    for box, score, gender, age in zip(boxes, scores, genders, ages):
+        people.append({"age": age, "gender": gender, "box": list(box),
+                       "confidence": round(score * 100, 2)})
 
-            # Predict gender
-            genderNet.setInput(face_blob)
-            gender_preds = genderNet.forward()
-            gender = GENDER_LIST[gender_preds[0].argmax()]
+    if draw:
+        with stage("draw"):
+            draw_people(image, people)
+
+    return people
 
-            # Predict age
-            ageNet.setInput(face_blob)
-            age_preds = ageNet.forward()
-            age = AGE_BUCKETS[age_preds[0].argmax()]
 
-            # Draw rectangle + label
-            label = f"{gender}, {age}"
-            cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(image, label, (x1, y1 - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
+def draw_people(image, people):
+    """Draw the boxes and age/gender labels returned by recognize_faces_image."""
+    for person in people:
+        x1, y1, x2, y2 = person["box"]
+        # Draw rectangle + label
+        label = f"{person['gender']}, {person['age']}"
+        cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(image, label, (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
 
-            people.append({"age": age, "gender": gender})
+
+def recognize_faces(image_path: str, output_path: str, batch_size=FACE_BATCH_SIZE):
+    # Load image
+    with stage("read"):
+        image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError(f"Could not read image at {image_path}")
+
+    people = recognize_faces_image(image, batch_size)
 
     # Save output
-    cv2.imwrite(output_path, image)
+    with stage("write"):
+        cv2.imwrite(output_path, image)
 
     return people
+
+
+def recognize_faces_bytes(data: bytes, ext: str = ".jpg", batch_size=FACE_BATCH_SIZE):
+    """In-memory variant of recognize_faces. Returns (encoded_image, people)."""
+    image = decode_image(data)
+    people = recognize_faces_image(image, batch_size)
+    return encode_image(image, ext), people
@@ -0,0 +1,93 @@
+import io
+
+import cv2
+import numpy as np
+
+from models.stages import stage
+
+try:
+    from PIL import Image
+except ImportError:  # header check falls back to decoding first
+    Image = None
+
+# Largest image accepted by decode_image, in pixels (width * height)
+SETTINGS = {"max_pixels": 50_000_000}
+
+# IMREAD_REDUCED_* decodes JPEGs at 1/2, 1/4 or 1/8 scale inside libjpeg,
+# so the full-size bitmap is never allocated
+REDUCED_COLOR = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an image exceeds SETTINGS["max_pixels"]."""
+
+
+def configure(max_pixels=None):
+    if max_pixels is not None:
+        SETTINGS["max_pixels"] = int(max_pixels)
+
+
+def image_size(data):
+    """(width, height) from the file header, or None if it cannot be read."""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as header:
+            return header.size
+    except Image.DecompressionBombError:
+        return (SETTINGS["max_pixels"] + 1, 1)
+    except Exception:
+        return None
+
+
+def _check_pixels(width, height):
+    if width * height > SETTINGS["max_pixels"]:
+        raise ImageTooLarge(
+            f"Image is {width}x{height}; the limit is {SETTINGS['max_pixels']:,} pixels")
+
+
+def decode_image(data, flags=cv2.IMREAD_COLOR):
+    """Decode encoded image bytes (PNG/JPEG/...) into a BGR array."""
+    size = image_size(data)
+    if size is not None:
+        _check_pixels(*size)
+    with stage("decode"):
+        buf = np.frombuffer(data, dtype=np.uint8)
+        image = cv2.imdecode(buf, flags) if buf.size else None
+    if image is None:
+        raise ValueError("Could not decode image data")
+    if size is None:
+        _check_pixels(image.shape[1], image.shape[0])
+    return image
+
+
+def decode_reduced(data, max_side):
+    """Decode at the smallest 1/2, 1/4 or 1/8 scale whose longest side is
+    still at least max_side. Returns (image, factor); multiply coordinates
+    found in image by factor to map them back to the original."""
+    size = image_size(data)
+    factor = 1
+    if size is not None:
+        _check_pixels(*size)
+        while factor < 8 and max(size) / (factor * 2) >= max_side:
+            factor *= 2
+    if factor == 1:
+        return decode_image(data), 1
+    with stage("decode"):
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), REDUCED_COLOR[factor])
+    if image is None:
+        raise ValueError("Could not decode image data")
+    # PNG and other formats are scaled after decoding; use the true ratio
+    return image, max(size) / max(image.shape[:2])
+
+
+def encode_image(image, ext=".jpg"):
+    """Encode an array back to bytes in the format given by ext."""
+    if not ext.startswith("."):
+        ext = "." + ext
+    with stage("encode"):
+        ok, buf = cv2.imencode(ext, image)
+    if not ok:
+        raise ValueError(f"Could not encode image as {ext}")
+    return buf.tobytes()
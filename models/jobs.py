@@ -0,0 +1,311 @@
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from models.perprocess import PerProcess
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit() when max_pending jobs are already queued."""
+
+
+class JobTimeout(Exception):
+    pass
+
+
+# Worker side. These run inside the pool processes, so model modules are only
+# imported there and the parent never pays for them.
+
+def _face_detection(data, params):
+    from models.face_detection import detect_faces_bytes
+    params = dict(params)
+    return detect_faces_bytes(data, params.pop("ext", ".jpg"), **params)
+
+
+def _face_recognition(data, params):
+    from models.face_recognition import recognize_faces_bytes
+    return recognize_faces_bytes(data, params.get("ext", ".jpg"))
+
+
+def _object_detection(data, params):
+    from models.object_detection import detect_objects_bytes
+    return detect_objects_bytes(data, params.get("ext", ".jpg"), params.get("tiled"))
+
+
+def _filter(data, params):
+    from models.filters import apply_filter_bytes
+    params = dict(params)
+    filter_type = params.pop("filter", "none")
+    return apply_filter_bytes(data, filter_type, **params), None
+
+
+OPERATIONS = {
+    "face_detection": _face_detection,
+    "face_recognition": _face_recognition,
+    "object_detection": _object_detection,
+    "filter": _filter,
+}
+
+
+# Set in each worker by init_worker; run_job reports (job_id, pid) on it so
+# the parent knows which process to kill when a job overruns
+_started = None
+
+
+def init_worker(started=None, config=None):
+    """Set up a pool process.
+
+    Spawned workers import the model modules afresh, with their defaults;
+    config carries the parent's settings as {"registry": {...},
+    "face_detection": {...}, "object_detection": {...}, "imageio": {...}},
+    each passed to that module's configure().
+    """
+    global _started
+    import cv2
+    from models import bands, face_detection, imageio, object_detection
+    from models.registry import registry
+    # One OpenCV thread and no filter band threads per process; the pool
+    # provides the parallelism
+    cv2.setNumThreads(1)
+    bands.configure(workers=1)
+    config = config or {}
+    registry.configure(**config.get("registry", {}))
+    face_detection.configure(**config.get("face_detection", {}))
+    object_detection.configure(**config.get("object_detection", {}))
+    imageio.configure(**config.get("imageio", {}))
+    _started = started
+
+
+def _on_timeout(signum, frame):
+    raise JobTimeout("Job exceeded its time limit")
+
+
+def run_job(operation, data, params, timeout=None, job_id=None):
+    if _started is not None and job_id is not None:
+        _started.put((job_id, os.getpid()))
+
+    # Cooperative fast path: SIGALRM interrupts at the next Python bytecode,
+    # i.e. as soon as the current OpenCV call returns. A call that never
+    # returns in time is killed by the parent's watchdog instead.
+    use_alarm = bool(timeout) and hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return OPERATIONS[operation](data, params)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+# Parent side
+
+class Job:
+    __slots__ = ("id", "operation", "ext", "status", "created", "finished",
+                 "error", "image", "results", "future", "pool", "args",
+                 "started", "pid", "retried")
+
+    def __init__(self, operation, ext=".jpg"):
+        self.id = uuid.uuid4().hex
+        self.operation = operation
+        self.ext = ext
+        self.status = "queued"
+        self.created = time.time()
+        self.finished = None
+        self.error = None
+        self.image = None
+        self.results = None
+        self.future = None
+        self.pool = None
+        # (data, params) until the job finishes, so it can be resubmitted
+        self.args = None
+        # Parent monotonic time and worker pid once a worker picked it up
+        self.started = None
+        self.pid = None
+        self.retried = False
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed", "timeout")
+
+    def to_dict(self):
+        status = self.status
+        if status == "queued" and self.started is not None:
+            status = "running"
+        return {
+            "id": self.id,
+            "operation": self.operation,
+            "status": status,
+            "created": self.created,
+            "finished": self.finished,
+            "error": self.error,
+            "results": self.results,
+        }
+
+
+class JobQueue:
+    """Runs slow operations on a bounded process pool.
+
+    At most max_pending jobs may be queued or running; beyond that submit()
+    raises QueueFull so the caller can push back on the client. Finished
+    jobs are kept for ttl seconds so their results can be fetched.
+
+    A job still running grace seconds after its timeout (say, stuck in one
+    long native call where SIGALRM cannot fire) has its worker process
+    killed by a watchdog thread and is marked "timeout". Other jobs that
+    were in the same pool are resubmitted once to a fresh pool.
+
+    worker_config is handed to init_worker in every pool process; it is
+    pickled when a pool starts, so later changes reach the next pool.
+    """
+
+    def __init__(self, max_workers=None, max_pending=32, timeout=60, ttl=600,
+                 start_method="spawn", grace=2.0, watch_interval=0.5,
+                 worker_config=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.ttl = ttl
+        self.start_method = start_method
+        self.grace = grace
+        self.watch_interval = watch_interval
+        self.worker_config = worker_config
+        self._jobs = {}
+        self._pool = PerProcess(self._new_pool)
+        self._started = None
+        self._watchdog = PerProcess(self._start_watchdog_thread)
+        self._lock = threading.RLock()
+
+    def _new_pool(self):
+        context = multiprocessing.get_context(self.start_method)
+        self._started = context.Queue()
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(self._started, self.worker_config)
+        )
+
+    def _reset_pool(self, pool=None):
+        # Caller holds the lock. With pool given, only reset if it is still
+        # the current one, so several broken futures reset it once
+        current = self._pool.current
+        if current is not None and (pool is None or pool is current):
+            current.shutdown(wait=False, cancel_futures=True)
+            self._pool.reset()
+
+    def submit(self, operation, data, **params):
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown operation: {operation}")
+
+        job = Job(operation, params.get("ext", ".jpg"))
+        job.args = (data, params)
+        with self._lock:
+            self._purge()
+            if self.pending() >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} jobs already pending")
+            self._jobs[job.id] = job
+            self._watchdog.get()
+            self._dispatch(job)
+        return job
+
+    def _dispatch(self, job):
+        # Caller holds the lock
+        data, params = job.args
+        try:
+            pool = self._pool.get()
+            future = pool.submit(run_job, job.operation, data, params, self.timeout, job.id)
+        except BrokenProcessPool:
+            self._reset_pool()
+            pool = self._pool.get()
+            future = pool.submit(run_job, job.operation, data, params, self.timeout, job.id)
+        job.future, job.pool = future, pool
+        future.add_done_callback(lambda f: self._finish(job, f))
+
+    def _finish(self, job, future):
+        if job.done or future is not job.future:
+            # Already timed out by the watchdog, or resubmitted
+            return
+        try:
+            job.image, job.results = future.result()
+            job.status = "done"
+        except JobTimeout as e:
+            job.status = "timeout"
+            job.error = str(e)
+        except BrokenProcessPool as e:
+            with self._lock:
+                self._reset_pool(job.pool)
+                if not job.retried:
+                    # Most likely collateral from another job's worker being
+                    # killed; run it again on the fresh pool
+                    job.retried = True
+                    job.started = job.pid = None
+                    self._dispatch(job)
+                    return
+            job.status = "failed"
+            job.error = f"Worker process died: {e}"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        self._close(job)
+
+    def _close(self, job):
+        job.finished = time.time()
+        job.future = job.pool = job.args = None
+
+    def _start_watchdog_thread(self):
+        thread = threading.Thread(target=self._watch_forever, daemon=True, name="job-watchdog")
+        thread.start()
+        return thread
+
+    def _watch_forever(self):
+        while True:
+            try:
+                self.check_deadlines()
+            except Exception as e:
+                print(f"Job watchdog failed: {e}")
+            time.sleep(self.watch_interval)
+
+    def check_deadlines(self):
+        """Record which worker runs each job and kill workers past the deadline."""
+        started = self._started
+        while started is not None:
+            try:
+                job_id, pid = started.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                break
+            job = self._jobs.get(job_id)
+            if job is not None and not job.done:
+                job.started, job.pid = time.monotonic(), pid
+
+        if not self.timeout:
+            return
+        deadline = time.monotonic() - self.timeout - self.grace
+        for job in list(self._jobs.values()):
+            if job.done or job.started is None or job.started > deadline:
+                continue
+            job.status = "timeout"
+            job.error = "Job exceeded its time limit; worker process was killed"
+            self._close(job)
+            try:
+                os.kill(job.pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def pending(self):
+        return sum(1 for job in list(self._jobs.values()) if not job.done)
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.done and job.finished < cutoff:
+                del self._jobs[job_id]
@@ -0,0 +1,179 @@
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a cached hit to a slow filter on a big photo
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in items]
+
+
+class Gauge(Metric):
+    """Value read from a callback at scrape time.
+
+    The callback returns a number, or {label_values_tuple: number}; None
+    means "not known yet" and the sample is left out. Use kind="counter"
+    for totals that are kept elsewhere, like cache hits.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help_text, callback, labels=(), kind="gauge"):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+        self.kind = kind
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        samples = [f"{self.name}{_labels(self.label_names, k)} {float(v)}"
+                   for k, v in sorted(value.items()) if v is not None]
+        return self.header() + samples if samples else []
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            for bound, n in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', bound)])} {n}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.add(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=BUCKETS):
+        return self.add(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, callback, labels=(), kind="gauge"):
+        return self.add(Gauge(name, help_text, callback, labels, kind))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def current_rss():
+    """Resident set size in bytes (Linux /proc, else the peak from getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+metrics = MetricsRegistry()
+
+requests_total = metrics.counter(
+    "lynx_http_requests_total", "HTTP requests by route, method and status",
+    ("route", "method", "status"))
+request_seconds = metrics.histogram(
+    "lynx_http_request_duration_seconds", "Time to produce a response, by route",
+    ("route", "method"))
+model_seconds = metrics.histogram(
+    "lynx_model_duration_seconds", "Time spent in each model or filter call",
+    ("model",))
+stage_seconds = metrics.histogram(
+    "lynx_stage_duration_seconds",
+    "Time per pipeline stage (decode, read, preprocess, forward, postprocess, draw, encode, write, ...)",
+    ("stage",))
+metrics.gauge(
+    "lynx_process_resident_memory_bytes", "Resident memory of this process", current_rss)
+
+
+def timing_hook(name, kind):
+    """Span hook (see models.stages.add_span_hook) feeding the histograms."""
+    return _timed(model_seconds if kind == "model" else stage_seconds,
+                  model=name, stage=name)
+
+
+@contextmanager
+def _timed(histogram, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start,
+                          **{k: labels[k] for k in histogram.label_names})
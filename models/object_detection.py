@@ -1,113 +1,188 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
-import os
-
-def detect_objects(input_path, output_path):
-    # Paths to MobileNet-SSD files
-    models_dir = os.path.join("models", "pretrained")
-    prototxt_path = os.path.join(models_dir, "MobileNetSSD_deploy.prototxt")
-    model_path = os.path.join(models_dir, "MobileNetSSD_deploy.caffemodel")
-    
-    # MobileNet-SSD class labels
-    CLASSES = [
-        "background", "aeroplane", "bicycle", "bird", "boat",
-        "bottle", "bus", "car", "cat", "chair", "cow", "diningtable",
-        "dog", "horse", "motorbike", "person", "pottedplant", "sheep",
-        "sofa", "train", "tvmonitor"
-    ]
-    
-    # Generate random colors for each class
-    COLORS = np.random.uniform(0, 255, size=(len(CLASSES), 3))
-    
-    # Load the model
-    net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
-    
-    # Read image
-    image = cv2.imread(input_path)
-    if image is None:
-        raise ValueError(f"Could not read image at {input_path}")
-    
-    height, width = image.shape[:2]
-    
-    blob = cv2.dnn.blobFromImage(
-        cv2.resize(image, (300, 300)),
-        0.007843,
-        (300, 300),
-        127.5
+
+from models.imageio import decode_image, encode_image
+from models.postprocess import clamp_boxes, draw_labelled_boxes, nms, scale_boxes, threshold_rows
+from models.scheduler import infer
+from models.stages import stage, traced
+
+# MobileNet-SSD class labels
+CLASSES = [
+    "background", "aeroplane", "bicycle", "bird", "boat",
+    "bottle", "bus", "car", "cat", "chair", "cow", "diningtable",
+    "dog", "horse", "motorbike", "person", "pottedplant", "sheep",
+    "sofa", "train", "tvmonitor"
+]
+
+# One colour per class, fixed so every worker draws the same palette
+COLORS = np.random.RandomState(42).uniform(0, 255, size=(len(CLASSES), 3))
+
+SSD_SIZE = 300
+CONFIDENCE_THRESHOLD = 0.5
+
+# Tiled mode for large images: overlapping tile_size crops (grown when needed
+# to stay within max_tiles) plus one whole-image view, batch_size crops per
+# forward pass and up to workers passes in flight. Boxes found twice in the
+# overlaps are merged with per-class NMS.
+SETTINGS = {
+    "tiled": False,
+    "tile_size": 300,
+    "overlap": 0.25,
+    "max_tiles": 16,
+    "batch_size": 8,
+    "workers": 2,
+    "nms_threshold": 0.45,
+}
+
+
+def configure(**settings):
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown object detection settings: {sorted(unknown)}")
+    SETTINGS.update(settings)
+
+
+def _tile_starts(length, size, overlap):
+    if length <= size:
+        return [0]
+    stride = max(1, int(size * (1 - overlap)))
+    count = -(-(length - size) // stride) + 1
+    return np.linspace(0, length - size, count).round().astype(int).tolist()
+
+
+def tile_grid(width, height, tile_size, overlap, max_tiles):
+    """(x, y, w, h) crops covering the image, at most max_tiles of them."""
+    size = tile_size
+    while True:
+        xs = _tile_starts(width, size, overlap)
+        ys = _tile_starts(height, size, overlap)
+        if len(xs) * len(ys) <= max_tiles:
+            break
+        size = int(size * 1.25) + 1
+    return [(x, y, min(size, width), min(size, height)) for y in ys for x in xs]
+
+
+def _forward_regions(image, regions, batch_size, workers, resized=None):
+    """Run SSD on each (x, y, w, h) region; returns class ids, scores and
+    boxes in image coordinates for detections above the threshold.
+
+    resized, if given, is the first (whole-image) region already scaled.
+    """
+    with stage("preprocess"):
+        crops = [resized if i == 0 and resized is not None else
+                 cv2.resize(image[y:y + h, x:x + w], (SSD_SIZE, SSD_SIZE))
+                 for i, (x, y, w, h) in enumerate(regions)]
+        starts = range(0, len(crops), batch_size)
+
+    def run(start):
+        blob = cv2.dnn.blobFromImages(crops[start:start + batch_size], 0.007843,
+                                      (SSD_SIZE, SSD_SIZE), 127.5)
+        return start, infer("ssd", blob)
+
+    with stage("forward"):
+        if workers > 1 and len(starts) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outputs = list(pool.map(run, starts))
+        else:
+            outputs = [run(start) for start in starts]
+
+    with stage("postprocess"):
+        rows = []
+        for start, out in outputs:
+            det = threshold_rows(out, CONFIDENCE_THRESHOLD, skip_background=True)
+            det[:, 0] += start
+            rows.append(det)
+        rows = np.concatenate(rows)
+        boxes = scale_boxes(rows, regions)
+    return rows[:, 1].astype(int), rows[:, 2], boxes
+
+
+def draw_detection(image, box, label_text, color):
+    """Draw one labelled bounding box in place."""
+    draw_labelled_boxes(image, [box], [label_text], [color])
+
+
+def draw_detections(image, detections):
+    """Draw every detection dict from detect_objects_image in place."""
+    draw_labelled_boxes(
+        image,
+        [det['box'] for det in detections],
+        [f"{det['label']}: {det['confidence'] / 100:.2f}" for det in detections],
+        [COLORS[det['class_id']] for det in detections]
     )
-    
-    net.setInput(blob)
-    detections = net.forward()
-    
+
+
+@traced("object_detection")
+def detect_objects_image(image, draw=True, tiled=None, resized=None):
+    """Run MobileNet-SSD on a BGR array and, if draw, annotate it in place.
+
+    tiled overrides SETTINGS["tiled"] for this call; resized may hold the
+    image already scaled to 300x300.
+    """
+    height, width = image.shape[:2]
+    tiled = SETTINGS["tiled"] if tiled is None else tiled
+
+    regions = [(0, 0, width, height)]
+    if tiled and max(width, height) > SETTINGS["tile_size"]:
+        regions += tile_grid(width, height, SETTINGS["tile_size"],
+                             SETTINGS["overlap"], SETTINGS["max_tiles"])
+
+    class_ids, scores, boxes = _forward_regions(
+        image, regions, max(1, SETTINGS["batch_size"]), SETTINGS["workers"], resized)
+
     object_counts = {}
     detections_list = []
-    
-    for i in range(detections.shape[2]):
-        confidence = detections[0, 0, i, 2]
-        
-        # Filter by confidence threshold (50%)
-        if confidence > 0.5:
-            # Get class ID and label
-            class_id = int(detections[0, 0, i, 1])
+
+    with stage("postprocess"):
+        if len(regions) > 1:
+            keep = nms(boxes, scores, class_ids, SETTINGS["nms_threshold"])
+            class_ids, scores, boxes = class_ids[keep], scores[keep], boxes[keep]
+        boxes = clamp_boxes(boxes, width, height)
+
+        for class_id, confidence, box in zip(class_ids.tolist(), scores.tolist(), boxes.tolist()):
             label = CLASSES[class_id]
-            
-            if label == "background":
-                continue
-            
+
             # Count objects by type
-            if label in object_counts:
-                object_counts[label] += 1
-            else:
-                object_counts[label] = 1
-            
+            object_counts[label] = object_counts.get(label, 0) + 1
+
             detections_list.append({
                 'label': label,
-                'confidence': round(confidence * 100, 2)
+                'class_id': class_id,
+                'confidence': round(confidence * 100, 2),
+                'box': box
             })
-            box = detections[0, 0, i, 3:7] * np.array([width, height, width, height])
-            (startX, startY, endX, endY) = box.astype("int")
-            
-            color = COLORS[class_id].tolist()
-            
-            # Draw bounding box
-            cv2.rectangle(image, (startX, startY), (endX, endY), color, 2)
-            
-            label_text = f"{label}: {confidence:.2f}"
-            
-            (text_width, text_height), baseline = cv2.getTextSize(
-                label_text,
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.5,
-                2
-            )
-            
-            y = startY - 10 if startY - 10 > 10 else startY + 10
-            
-            # Draw background rectangle for text
-            cv2.rectangle(
-                image,
-                (startX, y - text_height - 5),
-                (startX + text_width, y),
-                color,
-                -1
-            )
-            
-            # Draw label text
-            cv2.putText(
-                image,
-                label_text,
-                (startX, y - 5),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.5,
-                (255, 255, 255),
-                2
-            )
-    
-    # Save processed image
-    cv2.imwrite(output_path, image)
-    
+
+    if draw:
+        with stage("draw"):
+            draw_detections(image, detections_list)
+
     return {
         'total_objects': len(detections_list),
         'object_counts': object_counts,
         'detections': detections_list
-    }
\ No newline at end of file
+    }
+
+
+def detect_objects(input_path, output_path, tiled=None):
+    # Read image
+    with stage("read"):
+        image = cv2.imread(input_path)
+    if image is None:
+        raise ValueError(f"Could not read image at {input_path}")
+
+    results = detect_objects_image(image, tiled=tiled)
+
+    # Save processed image
+    with stage("write"):
+        cv2.imwrite(output_path, image)
+
+    return results
+
+
+def detect_objects_bytes(data: bytes, ext: str = ".jpg", tiled=None):
+    """In-memory variant of detect_objects. Returns (encoded_image, results)."""
+    image = decode_image(data)
+    results = detect_objects_image(image, tiled=tiled)
+    return encode_image(image, ext), results
@@ -0,0 +1,44 @@
+import os
+import threading
+import weakref
+
+
+class PerProcess:
+    """A lazily built object (thread pool, thread, process pool) per process.
+
+    Threads do not survive fork(): a pool or thread created before gunicorn
+    or multiprocessing forks is dead weight in the child. get() builds the
+    object with factory() on first use and again in each new process.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            # The lock may have been held by another thread at fork time
+            ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: ref() and ref()._after_fork())
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def get(self):
+        pid = os.getpid()
+        if self._value is None or self._pid != pid:
+            with self._lock:
+                if self._value is None or self._pid != pid:
+                    self._value = self.factory()
+                    self._pid = pid
+        return self._value
+
+    @property
+    def current(self):
+        """The object built in this process, or None; never builds one."""
+        return self._value if self._pid == os.getpid() else None
+
+    def reset(self):
+        """Forget the current object; the next get() builds a new one."""
+        with self._lock:
+            self._value = None
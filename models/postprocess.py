@@ -0,0 +1,119 @@
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def threshold_rows(out, threshold, skip_background=False):
+    """Rows of an SSD-style [1, 1, N, 7] output scoring above threshold.
+
+    Each row is [image_id, class_id, score, x1, y1, x2, y2] with normalized
+    coordinates; one boolean mask selects them all at once.
+    """
+    rows = out.reshape(-1, 7)
+    keep = rows[:, 2] > threshold
+    if skip_background:
+        keep &= rows[:, 1] > 0
+    return rows[keep]
+
+
+def scale_boxes(rows, regions):
+    """Pixel boxes for rows, each scaled into the (x, y, w, h) region
+    indexed by its image id (one region per image in the blob)."""
+    regions = np.asarray(regions, dtype=np.float64)
+    x, y, w, h = regions[rows[:, 0].astype(int)].T
+    return rows[:, 3:7] * np.stack([w, h, w, h], axis=1) + np.stack([x, y, x, y], axis=1)
+
+
+def clamp_boxes(boxes, width, height):
+    """Clip [x1, y1, x2, y2] boxes to the image and convert to int."""
+    boxes = boxes.astype(int)
+    np.clip(boxes[:, 0::2], 0, width - 1, out=boxes[:, 0::2])
+    np.clip(boxes[:, 1::2], 0, height - 1, out=boxes[:, 1::2])
+    return boxes
+
+
+def detections(out, threshold, width, height, skip_background=False):
+    """(class_ids, scores, int boxes) for a single-image SSD output."""
+    rows = threshold_rows(out, threshold, skip_background)
+    scale = np.array([width, height, width, height], dtype=np.float64)
+    boxes = clamp_boxes(rows[:, 3:7] * scale, width, height)
+    return rows[:, 1].astype(int), rows[:, 2], boxes
+
+
+def nms(boxes, scores, class_ids, threshold):
+    """Greedy per-class non-maximum suppression. Returns the kept indices."""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=int)
+
+    # Shift each class into its own coordinate range so one pass handles all
+    boxes = boxes.astype(np.float64) + (class_ids * (boxes.max() + 1))[:, None]
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= threshold]
+    return np.array(keep, dtype=int)
+
+
+@lru_cache(maxsize=2048)
+def text_size(text, scale=0.5, thickness=2):
+    return cv2.getTextSize(text, FONT, scale, thickness)
+
+
+@lru_cache(maxsize=2048)
+def label_patch(text, color, scale=0.5, thickness=2):
+    """A text label rendered white on a filled color background, ready to be
+    pasted; color is a BGR tuple."""
+    (width, height), _ = text_size(text, scale, thickness)
+    patch = np.empty((height + 6, width + 1, 3), dtype=np.uint8)
+    patch[:] = color
+    cv2.putText(patch, text, (0, height), FONT, scale, (255, 255, 255), thickness)
+    patch.flags.writeable = False
+    return patch
+
+
+def paste(image, patch, x, y):
+    """Copy patch onto image with its top-left at (x, y), clipped to bounds."""
+    h, w = image.shape[:2]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(w, x + patch.shape[1]), min(h, y + patch.shape[0])
+    if x0 < x1 and y0 < y1:
+        image[y0:y1, x0:x1] = patch[y0 - y:y1 - y, x0 - x:x1 - x]
+
+
+def draw_labelled_boxes(image, boxes, labels, colors, thickness=2):
+    """Draw [x1, y1, x2, y2] boxes with a filled label above each, in place.
+
+    Labels come from the label_patch cache, so repeated labels cost one
+    slice copy instead of getTextSize + rectangle + putText.
+    """
+    for (x1, y1, x2, y2), text, color in zip(boxes, labels, colors):
+        color = tuple(int(round(c)) for c in color)
+        cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), color, thickness)
+        patch = label_patch(text, color)
+        # Label sits above the box, or just inside it near the top edge
+        y = y1 - 10 if y1 - 10 > 10 else y1 + 10
+        paste(image, patch, int(x1), int(y) - patch.shape[0] + 1)
+
+
+def rescale_results(results, factor):
+    """Multiply every "box" list found in nested result dicts/lists by
+    factor, e.g. to map boxes from a reduced decode back to full size."""
+    if isinstance(results, dict):
+        return {key: [int(round(v * factor)) for v in value] if key == "box"
+                else rescale_results(value, factor)
+                for key, value in results.items()}
+    if isinstance(results, list):
+        return [rescale_results(item, factor) for item in results]
+    return results
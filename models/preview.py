@@ -0,0 +1,83 @@
+import threading
+import uuid
+from collections import OrderedDict
+
+import cv2
+
+from models.filters import apply_filter_image
+from models.imageio import decode_image
+
+
+class PreviewSource:
+    """A decoded upload together with its downscaled proxy."""
+
+    __slots__ = ("image", "proxy", "scale")
+
+    def __init__(self, image, proxy_max_side):
+        h, w = image.shape[:2]
+        self.image = image
+        self.scale = min(1.0, proxy_max_side / float(max(h, w)))
+        if self.scale < 1.0:
+            size = (max(1, round(w * self.scale)), max(1, round(h * self.scale)))
+            self.proxy = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        else:
+            self.proxy = image
+
+    @property
+    def nbytes(self):
+        return self.image.nbytes + (self.proxy.nbytes if self.proxy is not self.image else 0)
+
+
+class PreviewCache:
+    """LRU of preview sources keyed by an opaque handle.
+
+    Sources are evicted least-recently-used first once the decoded arrays
+    take more than max_bytes.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, proxy_max_side=1024):
+        self.max_bytes = max_bytes
+        self.proxy_max_side = proxy_max_side
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def add(self, data):
+        """Decode data once and return (handle, source)."""
+        source = PreviewSource(decode_image(data), self.proxy_max_side)
+        handle = uuid.uuid4().hex
+        with self._lock:
+            self._items[handle] = source
+            self._size += source.nbytes
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, old = self._items.popitem(last=False)
+                self._size -= old.nbytes
+        return handle, source
+
+    def get(self, handle):
+        with self._lock:
+            source = self._items.get(handle)
+            if source is not None:
+                self._items.move_to_end(handle)
+            return source
+
+    def discard(self, handle):
+        with self._lock:
+            source = self._items.pop(handle, None)
+            if source is not None:
+                self._size -= source.nbytes
+
+
+def render_preview(source, filter_type="none", **params):
+    """Render the filter on the proxy image.
+
+    The blur slider is a kernel radius in full-resolution pixels, so it is
+    scaled down with the proxy to keep the preview looking like the export.
+    """
+    if params.get("blur") and source.scale < 1.0:
+        params["blur"] = max(1, round(int(params["blur"]) * source.scale))
+    return apply_filter_image(source.proxy, filter_type, **params)
+
+
+def render_full(source, filter_type="none", **params):
+    return apply_filter_image(source.image, filter_type, **params)
@@ -0,0 +1,338 @@
+import os
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(__file__)   # models/
+PRETRAINED_DIR = os.path.join(BASE_DIR, "pretrained")
+
+
+# Named backend/target pairs that can be selected from configuration.
+# "onnxruntime" runs ONNX variants through ONNX Runtime instead of cv2.dnn.
+BACKENDS = {
+    "default": ("DNN_BACKEND_DEFAULT", "DNN_TARGET_CPU"),
+    "opencv": ("DNN_BACKEND_OPENCV", "DNN_TARGET_CPU"),
+    "opencv_fp16": ("DNN_BACKEND_OPENCV", "DNN_TARGET_CPU_FP16"),
+    "openvino": ("DNN_BACKEND_INFERENCE_ENGINE", "DNN_TARGET_CPU"),
+    "onnxruntime": None,
+}
+
+
+def available_backends():
+    """Backends from BACKENDS that this OpenCV build (and environment) supports."""
+    names = []
+    for name, pair in BACKENDS.items():
+        if pair is None:
+            try:
+                import onnxruntime  # noqa: F401
+            except ImportError:
+                continue
+            names.append(name)
+            continue
+        backend, target = (getattr(cv2.dnn, attr, None) for attr in pair)
+        if backend is None or target is None:
+            continue
+        if name != "default":
+            try:
+                if target not in cv2.dnn.getAvailableTargets(backend):
+                    continue
+            except cv2.error:
+                continue
+        names.append(name)
+    return names
+
+
+class ModelSource:
+    """The files for one variant of a model and how to read them.
+
+    kind is "caffe" (prototxt, caffemodel), "tensorflow" (pb, pbtxt) or
+    "onnx" (model.onnx). Only ONNX sources can run on ONNX Runtime.
+    """
+
+    def __init__(self, kind, *files):
+        self.kind = kind
+        self.files = files
+
+    def available(self):
+        return all(os.path.exists(path) for path in self.files)
+
+    def read(self):
+        _require(*self.files)
+        if self.kind == "caffe":
+            return cv2.dnn.readNetFromCaffe(*self.files)
+        if self.kind == "onnx":
+            return cv2.dnn.readNetFromONNX(self.files[0])
+        return cv2.dnn.readNet(*self.files)
+
+
+class OrtNet:
+    """ONNX Runtime session behind the cv2.dnn.Net setInput()/forward() calls."""
+
+    def __init__(self, path, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self._blob = None
+
+    def setInput(self, blob):
+        self._blob = blob
+
+    def forward(self):
+        return self.session.run(None, {self.input_name: self._blob})[0]
+
+
+class ModelRegistry:
+    """Loads every DNN once per process and serialises access to it.
+
+    cv2.dnn.Net keeps its input and intermediate buffers on the object, so two
+    threads calling setInput()/forward() on the same net will trample each
+    other. Each model gets its own lock; callers borrow a net with acquire().
+
+    Which file variant (fp32, fp16, int8, ...) and which backend a model runs
+    on comes from configure(), or from autotune() measuring the options.
+    """
+
+    def __init__(self):
+        self._specs = {}
+        self._nets = {}
+        self._locks = {}
+        self._errors = {}
+        self.backend = "default"
+        self.variants = {}
+        self._choice = {}
+
+    def register(self, name, variants, input_size=None, batchable=True):
+        """Register a model with {variant: ModelSource}; "fp32" is the default.
+
+        batchable=False marks nets that only accept a batch of one image.
+        """
+        if isinstance(variants, ModelSource):
+            variants = {"fp32": variants}
+        self._specs[name] = {
+            "variants": variants,
+            "input_size": input_size,
+            "batchable": batchable,
+        }
+        self._locks[name] = threading.Lock()
+
+    def names(self):
+        return list(self._specs)
+
+    def is_batchable(self, name):
+        return self._specs[name]["batchable"]
+
+    def configure(self, backend=None, variants=None):
+        """Select the backend and per-model variants; loaded nets are dropped."""
+        if backend is not None:
+            if backend != "auto" and backend not in BACKENDS:
+                raise ValueError(f"Unknown DNN backend: {backend}")
+            self.backend = "default" if backend == "auto" else backend
+        if variants is not None:
+            self.variants = dict(variants)
+        for name in self.names():
+            with self._locks[name]:
+                self._nets.pop(name, None)
+                self._choice.pop(name, None)
+
+    def selection(self, name):
+        """(backend, variant) the model runs with."""
+        return self._choice.get(name, (self.backend, self.variants.get(name, "fp32")))
+
+    def available_variants(self, name):
+        return [v for v, src in self._specs[name]["variants"].items() if src.available()]
+
+    def build(self, name, backend="default", variant="fp32"):
+        """Create a fresh net for one backend/variant combination."""
+        source = self._specs[name]["variants"].get(variant)
+        if source is None:
+            raise KeyError(f"{name} has no {variant} variant")
+
+        if backend == "onnxruntime":
+            if source.kind != "onnx":
+                raise ValueError(f"{name}/{variant} is not an ONNX model")
+            _require(*source.files)
+            return OrtNet(source.files[0], threads=cv2.getNumThreads() or None)
+
+        net = source.read()
+        if backend != "default":
+            backend_id, target_id = (getattr(cv2.dnn, attr) for attr in BACKENDS[backend])
+            net.setPreferableBackend(backend_id)
+            net.setPreferableTarget(target_id)
+        return net
+
+    def _load(self, name):
+        # Caller must hold the model's lock
+        net = self._nets.get(name)
+        if net is None:
+            try:
+                net = self.build(name, *self.selection(name))
+            except Exception as e:
+                self._errors[name] = str(e)
+                raise
+            self._errors.pop(name, None)
+            self._nets[name] = net
+        return net
+
+    @contextmanager
+    def acquire(self, name):
+        """Borrow a net exclusively for one setInput()/forward() sequence."""
+        if name not in self._specs:
+            raise KeyError(f"Unknown model: {name}")
+        with self._locks[name]:
+            yield self._load(name)
+
+    def forward(self, name, blob):
+        with self.acquire(name) as net:
+            net.setInput(blob)
+            return net.forward()
+
+    def dummy_input(self, name):
+        size = self._specs[name]["input_size"]
+        if size is None:
+            return None
+        return np.zeros((1, 3, size[1], size[0]), dtype=np.float32)
+
+    def warm_up(self, names=None):
+        """Load the given models (default: all) and run one dummy pass each.
+
+        Returns per-model timings in milliseconds. A model that fails to load
+        is recorded in health() instead of aborting the others.
+        """
+        timings = {}
+        for name in names or self.names():
+            start = time.perf_counter()
+            try:
+                with self.acquire(name) as net:
+                    blob = self.dummy_input(name)
+                    if blob is not None:
+                        net.setInput(blob)
+                        net.forward()
+            except Exception as e:
+                print(f"Warm-up failed for {name}: {e}")
+                continue
+            timings[name] = round((time.perf_counter() - start) * 1000, 2)
+        return timings
+
+    def autotune(self, names=None, variants=None, runs=5):
+        """Time every usable backend (and allowed variant) and keep the fastest.
+
+        variants maps model -> list of variants to consider; by default only
+        the configured variant is tried, so accuracy never changes silently.
+        Returns {model: {"backend/variant": median_ms, ..., "selected": key}}.
+        """
+        report = {}
+        backends = available_backends()
+        for name in names or self.names():
+            allowed = (variants or {}).get(name, [self.variants.get(name, "fp32")])
+            candidates = [v for v in allowed if v in self.available_variants(name)]
+            blob = self.dummy_input(name)
+            timings = {}
+            # Only the fastest net so far is kept; each loser is released
+            # before the next candidate is built
+            best = best_net = None
+
+            for variant in candidates:
+                for backend in backends:
+                    net = None
+                    try:
+                        net = self.build(name, backend, variant)
+                        net.setInput(blob)
+                        net.forward()  # first pass includes backend initialisation
+                        samples = []
+                        for _ in range(runs):
+                            start = time.perf_counter()
+                            net.setInput(blob)
+                            net.forward()
+                            samples.append((time.perf_counter() - start) * 1000)
+                    except Exception:
+                        continue
+                    key = (backend, variant)
+                    timings[key] = round(statistics.median(samples), 3)
+                    if best is None or timings[key] < timings[best]:
+                        best, best_net = key, net
+                    net = None
+
+            if best is None:
+                continue
+            with self._locks[name]:
+                self._choice[name] = best
+                self._nets[name] = best_net
+                self._errors.pop(name, None)
+            result = {f"{b}/{v}": ms for (b, v), ms in timings.items()}
+            result["selected"] = "/".join(best)
+            report[name] = result
+        return report
+
+    def health(self):
+        return {
+            name: {
+                "loaded": name in self._nets,
+                "backend": self.selection(name)[0],
+                "variant": self.selection(name)[1],
+                "error": self._errors.get(name),
+            }
+            for name in self._specs
+        }
+
+
+def _require(*paths):
+    for path in paths:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model file not found: {path}")
+
+
+registry = ModelRegistry()
+
+# Face detection model
+FACE_PROTO = os.path.join(PRETRAINED_DIR, "opencv_face_detector.pbtxt")
+FACE_MODEL = os.path.join(PRETRAINED_DIR, "opencv_face_detector_uint8.pb")
+# Optional FP16 Caffe build of the same ResNet-10 SSD detector
+FACE_FP16_PROTO = os.path.join(PRETRAINED_DIR, "deploy.prototxt")
+FACE_FP16_MODEL = os.path.join(PRETRAINED_DIR, "res10_300x300_ssd_iter_140000_fp16.caffemodel")
+
+# Age model
+AGE_PROTO = os.path.join(PRETRAINED_DIR, "age_deploy.prototxt")
+AGE_MODEL = os.path.join(PRETRAINED_DIR, "age_net.caffemodel")
+
+# Gender model
+GENDER_PROTO = os.path.join(PRETRAINED_DIR, "gender_deploy.prototxt")
+GENDER_MODEL = os.path.join(PRETRAINED_DIR, "gender_net.caffemodel")
+
+# MobileNet-SSD object detection model
+SSD_PROTO = os.path.join(PRETRAINED_DIR, "MobileNetSSD_deploy.prototxt")
+SSD_MODEL = os.path.join(PRETRAINED_DIR, "MobileNetSSD_deploy.caffemodel")
+
+
+def _onnx_variants(stem):
+    """Reduced-precision ONNX exports, e.g. age_net_int8.onnx, when present."""
+    return {
+        variant: ModelSource("onnx", os.path.join(PRETRAINED_DIR, f"{stem}_{variant}.onnx"))
+        for variant in ("fp16", "int8")
+    }
+
+
+# The TensorFlow importer bakes the batch size into the face detector's graph
+registry.register("face", {
+    "fp32": ModelSource("tensorflow", FACE_MODEL, FACE_PROTO),
+    "fp16": ModelSource("caffe", FACE_FP16_PROTO, FACE_FP16_MODEL),
+}, input_size=(300, 300), batchable=False)
+registry.register("age", {
+    "fp32": ModelSource("caffe", AGE_PROTO, AGE_MODEL),
+    **_onnx_variants("age_net"),
+}, input_size=(227, 227))
+registry.register("gender", {
+    "fp32": ModelSource("caffe", GENDER_PROTO, GENDER_MODEL),
+    **_onnx_variants("gender_net"),
+}, input_size=(227, 227))
+registry.register("ssd", {
+    "fp32": ModelSource("caffe", SSD_PROTO, SSD_MODEL),
+    **_onnx_variants("MobileNetSSD"),
+}, input_size=(300, 300))
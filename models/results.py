@@ -0,0 +1,52 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class ResultStore:
+    """Bounded in-memory store for encoded result images.
+
+    Entries expire after ttl seconds and the oldest ones are evicted once the
+    total size passes max_bytes, so nothing has to be written to uploads/.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=600):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, data, mimetype="image/jpeg", ext=".jpg"):
+        """Store data and return the key it can be fetched with."""
+        key = uuid.uuid4().hex + ext
+        with self._lock:
+            self._items[key] = (data, mimetype, time.monotonic())
+            self._size += len(data)
+            self._evict()
+        return key
+
+    def get(self, key):
+        """Return (data, mimetype) or None if unknown or expired."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            data, mimetype, created = item
+            if time.monotonic() - created > self.ttl:
+                self._drop(key)
+                return None
+            return data, mimetype
+
+    def _drop(self, key):
+        data = self._items.pop(key)[0]
+        self._size -= len(data)
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._items:
+            key, (data, _, created) = next(iter(self._items.items()))
+            if self._size <= self.max_bytes and now - created <= self.ttl:
+                break
+            self._drop(key)
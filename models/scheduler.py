@@ -0,0 +1,135 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from models.perprocess import PerProcess
+from models.registry import registry
+
+# Defaults, overridden by configure() from app.config
+SETTINGS = {
+    "enabled": True,
+    "window_ms": 5.0,    # how long to wait for more requests to join a batch
+    "max_batch": 8,      # images per batched forward pass
+}
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def configure(enabled=None, window_ms=None, max_batch=None):
+    if enabled is not None:
+        SETTINGS["enabled"] = bool(enabled)
+    if window_ms is not None:
+        SETTINGS["window_ms"] = float(window_ms)
+    if max_batch is not None:
+        SETTINGS["max_batch"] = max(1, int(max_batch))
+
+
+def split_output(out, offset, count):
+    """Slice the rows belonging to one request out of a batched output.
+
+    SSD-style DetectionOutput layers return [1, 1, K, 7] where column 0 is the
+    image index inside the batch; classifiers return one row per image.
+    """
+    if out.ndim == 4 and out.shape[3] == 7:
+        ids = out[0, 0, :, 0]
+        part = out[:, :, (ids >= offset) & (ids < offset + count)].copy()
+        part[0, 0, :, 0] -= offset
+        return part
+    return out[offset:offset + count]
+
+
+class BatchScheduler:
+    """Collects blobs from concurrent requests and runs them as one batch.
+
+    The first queued blob opens a window of window_ms; anything that arrives
+    before it closes (up to max_batch images) shares the same forward pass.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._queue = queue.Queue()
+        self._worker = PerProcess(self._start_worker)
+
+    def _start_worker(self):
+        # Items queued before a fork belong to the parent's thread
+        self._queue = queue.Queue()
+        thread = threading.Thread(target=self._run, name=f"batch-{self.model}", daemon=True)
+        thread.start()
+        return thread
+
+    def submit(self, blob):
+        self._worker.get()
+        future = Future()
+        self._queue.put((blob, future))
+        return future
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        size = batch[0][0].shape[0]
+        deadline = time.monotonic() + SETTINGS["window_ms"] / 1000.0
+
+        while size < SETTINGS["max_batch"]:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += item[0].shape[0]
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            # Blobs can only be stacked when their shapes agree
+            groups = {}
+            for blob, future in batch:
+                groups.setdefault(blob.shape[1:], []).append((blob, future))
+
+            for items in groups.values():
+                self._forward(items)
+
+    def _forward(self, items):
+        try:
+            blob = items[0][0] if len(items) == 1 else np.concatenate([b for b, _ in items])
+            out = registry.forward(self.model, blob)
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+
+        offset = 0
+        for b, future in items:
+            future.set_result(split_output(out, offset, b.shape[0]))
+            offset += b.shape[0]
+
+
+def get_scheduler(model):
+    scheduler = _schedulers.get(model)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = _schedulers.setdefault(model, BatchScheduler(model))
+    return scheduler
+
+
+def queue_depths():
+    """Pending forward requests per model, for monitoring."""
+    return {model: scheduler.depth() for model, scheduler in list(_schedulers.items())}
+
+
+def infer(model, blob):
+    """Run blob through model, merging with concurrent callers when enabled."""
+    if not SETTINGS["enabled"] or not registry.is_batchable(model):
+        return registry.forward(model, blob)
+    return get_scheduler(model).submit(blob).result()
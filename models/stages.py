@@ -0,0 +1,83 @@
+import functools
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+_local = threading.local()
+
+# Span hooks: callables hook(name, kind) returning a context manager that is
+# entered around every stage ("stage") and traced model call ("model")
+_hooks = []
+
+
+def add_span_hook(hook):
+    """Register a tracing hook, e.g. one that opens an OpenTelemetry span:
+
+        add_span_hook(lambda name, kind: tracer.start_as_current_span(name))
+    """
+    _hooks.append(hook)
+
+
+def remove_span_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+@contextmanager
+def _span(name, kind):
+    with ExitStack() as spans:
+        for hook in list(_hooks):
+            spans.enter_context(hook(name, kind))
+        yield
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage (decode, preprocess, forward, draw, encode, ...).
+
+    Costs one attribute lookup unless a recorder or span hook is active.
+    """
+    totals = getattr(_local, "totals", None)
+    if totals is None and not _hooks:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        if _hooks:
+            with _span(name, "stage"):
+                yield
+        else:
+            yield
+    finally:
+        if totals is not None:
+            totals[name] = totals.get(name, 0.0) + time.perf_counter() - start
+
+
+def traced(name):
+    """Decorator that runs a model entry point inside a "model" span."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _hooks:
+                return fn(*args, **kwargs)
+            with _span(name, "model"):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def record_stages():
+    """Collect per-stage seconds for everything run on this thread.
+
+        with record_stages() as totals:
+            detect_objects_bytes(data)
+        totals  # {"decode": 0.004, "preprocess": 0.001, "forward": 0.02, ...}
+    """
+    previous = getattr(_local, "totals", None)
+    totals = {}
+    _local.totals = totals
+    try:
+        yield totals
+    finally:
+        _local.totals = previous
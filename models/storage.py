@@ -0,0 +1,151 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+
+from models.perprocess import PerProcess
+
+# <2 hex>/<2 hex>/<32-64 hex><ext>; anything else is refused by resolve()
+# and never touched by sweep()
+_NAME = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32,64}\.[a-z0-9]{1,5}$")
+# save() writes <name>.<pid>.<thread id>.tmp before renaming it into place
+_TEMP = re.compile(r"^(.+)\.\d+\.\d+\.tmp$")
+_SHARD = re.compile(r"^[0-9a-f]{2}$")
+
+
+class UploadStorage:
+    """Sharded, size- and age-bounded file store under root.
+
+    Files are named by content hash (identical uploads share one file) or a
+    random UUID (results), and sharded by the first two byte pairs of the
+    name so no directory grows large. Writes go to a temp file that is
+    renamed into place, so readers never see partial files. sweep() removes
+    files older than ttl seconds, then the oldest ones until the total is
+    below max_bytes; start_sweeper() runs it in the background.
+    """
+
+    def __init__(self, root, ttl=24 * 3600, max_bytes=1024 * 1024 * 1024, sweep_interval=300):
+        self.root = os.path.abspath(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._sweeper = PerProcess(self._start_sweeper)
+        self._lock = threading.Lock()
+
+    def save(self, data, ext=".jpg", content_hash=False):
+        """Write data atomically and return its relative name."""
+        ext = (ext if ext.startswith(".") else "." + ext).lower()
+        stem = hashlib.sha256(data).hexdigest() if content_hash else uuid.uuid4().hex
+        name = f"{stem[:2]}/{stem[2:4]}/{stem}{ext}"
+        path = os.path.join(self.root, name)
+
+        if content_hash and os.path.exists(path):
+            # Same bytes already stored; refresh the age instead of rewriting
+            os.utime(path)
+            return name
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return name
+
+    def resolve(self, name):
+        """Absolute path for a name returned by save(), or None."""
+        if not _NAME.match(name):
+            return None
+        path = os.path.join(self.root, name)
+        return path if os.path.isfile(path) else None
+
+    def _owned(self, name):
+        """Whether name (relative, "/"-separated) is a file save() creates."""
+        temp = _TEMP.match(name)
+        return bool(_NAME.match(temp.group(1) if temp else name))
+
+    def _walk(self):
+        # Only the two levels of shard directories; anything else under root
+        # (other files, checked-in examples) belongs to someone else
+        for dirpath, dirnames, files in os.walk(self.root):
+            rel = os.path.relpath(dirpath, self.root)
+            depth = 0 if rel == "." else rel.count(os.sep) + 1
+            dirnames[:] = [d for d in dirnames if depth < 2 and _SHARD.match(d)]
+            yield dirpath, rel, depth, files
+
+    def _entries(self):
+        entries = []
+        for dirpath, rel, depth, files in self._walk():
+            if depth != 2:
+                continue
+            for filename in files:
+                if not self._owned(f"{rel.replace(os.sep, '/')}/{filename}"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def sweep(self):
+        """Enforce ttl and max_bytes. Returns (files_removed, bytes_removed)."""
+        with self._lock:
+            now = time.time()
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            removed, freed = 0, 0
+            for mtime, size, path in entries:
+                expired = now - mtime > self.ttl
+                # Leftover temp files from crashed writers are only dropped
+                # once they are clearly stale
+                if path.endswith(".tmp") and now - mtime < 60:
+                    continue
+                if not expired and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+                freed += size
+            self._prune_dirs()
+        return removed, freed
+
+    def _prune_dirs(self):
+        shards = [(dirpath, depth) for dirpath, _, depth, _ in self._walk() if depth]
+        # Deepest first, so a first-level shard empties after its children
+        for dirpath, _ in sorted(shards, key=lambda entry: -entry[1]):
+            try:
+                if not os.listdir(dirpath):
+                    os.rmdir(dirpath)
+            except OSError:
+                pass
+
+    def stats(self):
+        entries = self._entries()
+        return {"files": len(entries), "bytes": sum(size for _, size, _ in entries)}
+
+    def start_sweeper(self):
+        """Sweep every sweep_interval seconds on a daemon thread (once per process)."""
+        self._sweeper.get()
+
+    def _start_sweeper(self):
+        thread = threading.Thread(target=self._sweep_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def _sweep_forever(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Upload sweep failed: {e}")
+            time.sleep(self.sweep_interval)
@@ -0,0 +1,297 @@
+import queue
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+import cv2
+
+# OpenCV trackers in order of preference. KCF and CSRT ship only with the
+# contrib build; the main package's MIL (~50 ms per box per 720p frame) is
+# slower than re-running detection, so without them TemplateTracker is used.
+TRACKER_NAMES = ["KCF", "CSRT"]
+
+
+class TemplateTracker:
+    """Follows a box by matching its initial patch in a window around the
+    last position. Needs only the base OpenCV build and costs a few
+    milliseconds per box at 720p; good for the few frames between detections.
+    """
+
+    def __init__(self, margin=0.5, min_score=0.5):
+        self.margin = margin
+        self.min_score = min_score
+        self.template = None
+        self.box = None
+
+    def init(self, frame, box):
+        x, y, w, h = (int(v) for v in box)
+        x, y = max(0, x), max(0, y)
+        patch = frame[y:y + h, x:x + w]
+        self.template = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY) if patch.size else None
+        self.box = (x, y, patch.shape[1], patch.shape[0])
+
+    def update(self, frame):
+        if self.template is None:
+            return False, self.box
+        x, y, w, h = self.box
+        dx, dy = int(w * self.margin), int(h * self.margin)
+        x0, y0 = max(0, x - dx), max(0, y - dy)
+        window = frame[y0:y + h + dy, x0:x + w + dx]
+        if window.shape[0] < h or window.shape[1] < w:
+            return False, self.box
+        scores = cv2.matchTemplate(cv2.cvtColor(window, cv2.COLOR_BGR2GRAY),
+                                   self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (bx, by) = cv2.minMaxLoc(scores)
+        if score < self.min_score:
+            return False, self.box
+        self.box = (x0 + bx, y0 + by, w, h)
+        return True, self.box
+
+
+def _tracker_factory(name):
+    for module in (cv2, getattr(cv2, "legacy", None)):
+        factory = getattr(module, f"Tracker{name}_create", None)
+        if factory is not None:
+            return factory
+    return None
+
+
+@lru_cache(maxsize=1)
+def tracker_name():
+    """The preferred tracker this OpenCV build provides, or "template"."""
+    for name in TRACKER_NAMES:
+        if _tracker_factory(name) is not None:
+            return name
+    return "template"
+
+
+def create_tracker():
+    name = tracker_name()
+    if name == "template":
+        return TemplateTracker()
+    return _tracker_factory(name)()
+
+
+def detect_frame(frame, mode):
+    """Run full detection on one frame. Returns [(box_xywh, label, color)]."""
+    if mode == "faces":
+        from models.face_detection import detect_faces_image
+        return [((int(x), int(y), int(w), int(h)), "face", (0, 255, 0))
+                for (x, y, w, h) in detect_faces_image(frame, draw=False)]
+
+    from models.object_detection import COLORS, detect_objects_image
+    boxes = []
+    for det in detect_objects_image(frame, draw=False)["detections"]:
+        x1, y1, x2, y2 = det["box"]
+        boxes.append(((x1, y1, max(1, x2 - x1), max(1, y2 - y1)),
+                      det["label"], COLORS[det["class_id"]].tolist()))
+    return boxes
+
+
+def draw_boxes(frame, boxes):
+    for (x, y, w, h), label, color in boxes:
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+        cv2.putText(frame, label, (x, max(12, y - 6)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+
+class StreamStats:
+    """Frame counters for one stream; fps is measured over the last second."""
+
+    def __init__(self):
+        self.frames_read = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.detections = 0
+        self.started = time.time()
+        self.finished = None
+        self.error = None
+        self._sent_times = deque(maxlen=120)
+        self._lock = threading.Lock()
+
+    def sent(self):
+        with self._lock:
+            self.frames_sent += 1
+            self._sent_times.append(time.monotonic())
+
+    def fps(self):
+        with self._lock:
+            now = time.monotonic()
+            recent = [t for t in self._sent_times if now - t <= 1.0]
+        return len(recent)
+
+    def to_dict(self):
+        return {
+            "frames_read": self.frames_read,
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "detections": self.detections,
+            "fps": self.fps(),
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+
+_END = object()
+
+
+class VideoPipeline:
+    """Decode -> detect/track -> encode, each on its own thread.
+
+    Full detection runs on every detect_every-th frame; trackers carry the
+    boxes in between. With realtime=True (cameras) the decoder drops the
+    oldest queued frame instead of blocking, so latency stays bounded when
+    inference falls behind; files are processed frame by frame.
+    """
+
+    def __init__(self, source, mode="objects", detect_every=5, realtime=True,
+                 queue_size=4, on_close=None):
+        self.source = source
+        self.mode = mode
+        self.detect_every = max(1, int(detect_every))
+        self.realtime = realtime
+        self.stats = StreamStats()
+        self._decoded = queue.Queue(maxsize=queue_size)
+        self._processed = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._claimed = False
+        self._on_close = on_close
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return self
+        for target in (self._decode, self._process):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    @property
+    def running(self):
+        """True once a client claimed it or start() has been called."""
+        return self._claimed or bool(self._threads)
+
+    def claim(self):
+        """Reserve the output for one consumer. Frames come off a single
+        queue, so two readers would each get about half of them. Returns
+        False if someone already claimed it."""
+        with self._lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+    def close(self):
+        # Playback ending and stream expiry may both close a pipeline
+        with self._lock:
+            if self._stop.is_set():
+                return
+            self._stop.set()
+        self.stats.finished = time.time()
+        if self._on_close is not None:
+            self._on_close()
+
+    def _put(self, q, item):
+        # Blocking put that still notices close()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decode(self):
+        capture = cv2.VideoCapture(self.source)
+        try:
+            if not capture.isOpened():
+                self.stats.error = f"Could not open video source {self.source}"
+                return
+            while not self._stop.is_set():
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                self.stats.frames_read += 1
+
+                if self.realtime:
+                    try:
+                        self._decoded.put_nowait(frame)
+                    except queue.Full:
+                        # Drop the stalest frame to stay close to live
+                        try:
+                            self._decoded.get_nowait()
+                            self.stats.frames_dropped += 1
+                        except queue.Empty:
+                            pass
+                        self._decoded.put_nowait(frame)
+                elif not self._put(self._decoded, frame):
+                    break
+        finally:
+            capture.release()
+            self._put(self._decoded, _END)
+
+    def _process(self):
+        trackers = []
+        index = 0
+        try:
+            while not self._stop.is_set():
+                try:
+                    frame = self._decoded.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if frame is _END:
+                    break
+
+                if index % self.detect_every == 0 or not trackers:
+                    boxes = detect_frame(frame, self.mode)
+                    self.stats.detections += 1
+                    trackers = []
+                    for box, label, color in boxes:
+                        tracker = create_tracker()
+                        tracker.init(frame, box)
+                        trackers.append((tracker, label, color))
+                else:
+                    boxes = []
+                    for tracker, label, color in trackers:
+                        ok, box = tracker.update(frame)
+                        if ok:
+                            boxes.append((tuple(int(v) for v in box), label, color))
+
+                draw_boxes(frame, boxes)
+                index += 1
+                if not self._put(self._processed, frame):
+                    break
+        except Exception as e:
+            self.stats.error = str(e)
+        finally:
+            self._put(self._processed, _END)
+
+    def frames(self, quality=80):
+        """Yield encoded JPEG frames; encoding runs on the caller's thread."""
+        self.start()
+        try:
+            while True:
+                try:
+                    frame = self._processed.get(timeout=0.5)
+                except queue.Empty:
+                    if self._stop.is_set():
+                        break
+                    continue
+                if frame is _END:
+                    break
+                ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                if ok:
+                    self.stats.sent()
+                    yield buf.tobytes()
+        finally:
+            self.close()
+
+    def mjpeg(self, quality=80):
+        """multipart/x-mixed-replace body for a browser <img> tag."""
+        for jpeg in self.frames(quality):
+            yield (b"--frame\r\nContent-Type: image/jpeg\r\n"
+                   b"Content-Length: " + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
@@ -0,0 +1,15 @@
+"""Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app (the default in gunicorn.conf.py) this module is imported
+once in the gunicorn master: models are loaded and warmed there, then the
+workers are forked and share the weights copy-on-write.
+"""
+import time
+
+started = time.perf_counter()
+
+from app import app, preload  # noqa: E402
+
+preload(started)